@@ -9,28 +9,96 @@ import os
 import requests
 import json
 import base64
-from datetime import datetime
+import hashlib
+import gzip
+import bz2
+import lzma
+from datetime import datetime, timedelta
 from typing import Dict, Any, Tuple, List, Iterator, Optional, Union
 from requests import Response
+from requests.adapters import HTTPAdapter
 import time
-from contextlib import redirect_stdout, redirect_stderr
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import threading
+import heapq
+import queue
+import random
+from email.utils import parsedate_to_datetime
+from contextlib import redirect_stdout, redirect_stderr, contextmanager, closing
+from collections import deque
+from itertools import groupby
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError, wait, FIRST_COMPLETED
 
 #
 # BEGIN Global Variables
 #
 global q_csv_file, q_database_file, q_api_fqdn, q_username, q_password, q_api_function
 global csv_data_contract, axonious_table_name, payload_template_str, q_max_asset_ids, x_requested_with, q_api_endpoint
+global q_api_search_endpoint, q_http_pool_size, q_retry_base_delay, q_retry_max_delay
+global q_retry_reorder_buffer, q_bisect_max_calls
+global q_insert_batch_size, q_csv_chunk_bytes, q_payload_cache_size, q_statement_cache_size, q_storage_profiles
+global q_history_vacuum_pages, q_log_commit_rows, q_log_commit_seconds, q_log_queue_size
+global q_run_options, q_run_summary
 dry_run_flag = False
 x_requested_with = 'custom_attributes_connector_v1.0'
 q_api_endpoint = "/qps/rest/2.0/update/am/asset"
+q_api_search_endpoint = "/qps/rest/2.0/search/am/asset"
 q_max_asset_ids = 100
+q_http_pool_size = 10  # Pooled keep-alive connections per API host, raised to --workers when larger
+q_retry_base_delay = 5  # First deferred retry delay in seconds, doubled per attempt with jitter
+q_retry_max_delay = 300  # Maximum deferred retry delay in seconds
+q_retry_reorder_buffer = 10000  # Completed calls held back while an earlier batch waits for a retry
+q_bisect_max_calls = 64  # Sub batch calls per batch when bisecting a batch that Qualys rejects
+q_insert_batch_size = 10000  # Rows per executemany batch for bulk inserts
+q_csv_chunk_bytes = 64 * 1024 * 1024  # Target byte range size per parallel CSV parse task
+q_payload_cache_size = 100000  # Cached serialized attribute sets and body fragments per payload builder
+q_statement_cache_size = 256  # Prepared statements cached by the run database connection, reused across stages
+q_history_vacuum_pages = 25600  # Free pages returned to the file system per run by a persistent database
+q_log_commit_rows = 500  # Execution log rows per commit of the execution log writer thread
+q_log_commit_seconds = 1.0  # Longest time an execution log row waits for its commit, in seconds
+q_log_queue_size = 10000  # Execution log rows queued for the writer thread before API results wait
+# Run options from command-line arguments, see get_config()
+q_run_options = {
+    'parse_workers': 1,
+    'baseline_db': None,
+    'prefetch': False,
+    'optimize_grouping': False,
+    'workers': 1,
+    'rate_limit': None,
+    'concurrency_limit': None,
+    'resume_db': None,
+    'max_asset_ids': 100,
+    'max_body_bytes': None,
+    'pipeline': 'materialized',
+    'audit_tables': False,
+    'asset_id_type': 'text',
+    'storage_profile': 'safe',
+    'db_mode': 'file',
+    'persistent_db': None,
+    'retention_days': 90,
+    'retention_runs': None,
+}
+# SQLite pragmas of each --storage-profile, applied to every connection of the run database.  safe keeps the
+# SQLite defaults, fast uses WAL with fsync only at checkpoints, bulk keeps the journal in memory and never fsyncs
+q_storage_profiles = {
+    'safe': {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'cache_size': -2000,
+             'temp_store': 'DEFAULT', 'mmap_size': 0},
+    'fast': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'cache_size': -65536,
+             'temp_store': 'MEMORY', 'mmap_size': 256 * 1024 * 1024},
+    'bulk': {'journal_mode': 'MEMORY', 'synchronous': 'OFF', 'cache_size': -262144,
+             'temp_store': 'MEMORY', 'mmap_size': 1024 * 1024 * 1024},
+}
+# Run summary lines collected by workflow stages, printed with the results
+q_run_summary = {}
 q_csv_file = Path('./data/input.csv')
 now = datetime.now()
 timestamp = now.strftime('%Y%m%d_%H%M%S')
 q_database_file = Path(f'custom_attributes_connector_sqlite_{timestamp}.db')
 q_log_file = Path(f'custom_attributes_connector_log_{timestamp}.log')
 axonious_table_name = 'axonious_data'
+# Compressed CSV inputs are detected by magic bytes and decoded as a stream
+csv_compression_magic = {b'\x1f\x8b': 'gzip',
+                         b'BZh': 'bz2',
+                         b'\xfd7zXZ\x00': 'xz'}
 # Define a dictionary to map old headers to new headers
 csv_data_contract = {'Qualys Scans: Qualys ID': 'AssetID',
                   'Mssql: MSSQL_ Business_Name': 'Business',
@@ -113,6 +181,473 @@ class DatabaseInsertError(Exception):
     """Raised when failing to insert a payload into the database."""
     pass
 
+# API client classes
+def compute_retry_delays(max_retries: int, min_delay: int, max_delay: int) -> List[int]:
+    """Returns the linear retry delay table, in seconds, from min_delay up to max_delay over max_retries attempts."""
+    retry_delays = []
+    if max_retries <= 1:
+        retry_delays.append(min_delay)  # Single retry uses min_delay
+    else:
+        step = (max_delay - min_delay) / (max_retries - 1)  # Linear step size
+        for i in range(max_retries):
+            delay = min_delay + (step * i)  # Calculate delay for this attempt
+            delay = min(int(delay), max_delay)  # Cap at max_delay and convert to integer
+            retry_delays.append(delay)
+    return retry_delays
+
+
+class QualysRateLimiter:
+    """
+    Client-side token bucket for the Qualys API.  Calls are paced to the subscription limit instead of
+    running into it: each call takes a token, tokens refill at limit / window seconds up to the
+    limit, and no more than the concurrency limit of calls run at once.  The limits start from the
+    configured subscription values (unlimited when not configured) and are updated live from the
+    X-RateLimit-* and X-Concurrency-Limit-* headers of every response.  X-RateLimit-Remaining resets
+    the bucket to the calls the server still allows, so the quota is used in full while it lasts and
+    calls slow to the refill rate, rather than failing with 429, once it is spent.  Thread safe.
+
+    Args:
+        calls_per_window (int): Subscription API calls per window, None until learned from headers.
+        window_sec (int): Length of the rate limit window in seconds (default: 3600).
+        concurrency_limit (int): Maximum concurrent calls, None until learned from headers.
+    """
+
+    def __init__(self, calls_per_window: int = None, window_sec: int = 3600, concurrency_limit: int = None):
+        self.condition = threading.Condition()
+        self.calls_per_window = calls_per_window
+        self.window_sec = window_sec
+        self.concurrency_limit = concurrency_limit
+        self.running = 0
+        # One token until the first response reports the calls remaining in the window
+        self.tokens = 1.0
+        self.last_refill = time.monotonic()
+        self.blocked_until = 0.0
+        self.total_wait = 0.0
+        self.calls = 0
+
+    def _refill(self, now: float) -> None:
+        if self.calls_per_window:
+            rate = self.calls_per_window / self.window_sec
+            self.tokens = min(self.tokens + (now - self.last_refill) * rate, float(self.calls_per_window))
+        self.last_refill = now
+
+    def acquire(self) -> None:
+        """Blocks until the call may start within the rate and concurrency limits."""
+        start = time.monotonic()
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = 0.0
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.concurrency_limit and self.running >= self.concurrency_limit:
+                    wait = None  # Woken by release()
+                elif self.calls_per_window and self.tokens < 1.0:
+                    wait = (1.0 - self.tokens) * self.window_sec / self.calls_per_window
+                if wait == 0.0:
+                    if self.calls_per_window:
+                        self.tokens -= 1.0
+                    self.running += 1
+                    self.calls += 1
+                    self.total_wait += now - start
+                    return
+                self.condition.wait(wait)
+
+    def release(self, headers: Optional[Dict[str, str]] = None) -> None:
+        """Frees the call's concurrency slot and applies the limits reported in its response headers."""
+        with self.condition:
+            self.running -= 1
+            if headers is not None:
+                self._update_from_headers(headers)
+            self.condition.notify_all()
+
+    def _update_from_headers(self, headers: Dict[str, str]) -> None:
+        def header_int(name: str) -> Optional[int]:
+            try:
+                return int(headers[name])
+            except (KeyError, TypeError, ValueError):
+                return None
+
+        now = time.monotonic()
+        self._refill(now)
+        limit = header_int('X-RateLimit-Limit')
+        window = header_int('X-RateLimit-Window-Sec')
+        remaining = header_int('X-RateLimit-Remaining')
+        to_wait = header_int('X-RateLimit-ToWait-Sec')
+        concurrency = header_int('X-Concurrency-Limit-Limit')
+        if limit:
+            self.calls_per_window = limit
+        if window:
+            self.window_sec = window
+        if concurrency:
+            self.concurrency_limit = concurrency
+        if remaining is not None and self.calls_per_window:
+            # The server's count is authoritative, less the calls still in flight
+            self.tokens = float(max(remaining - self.running, 0))
+        if to_wait:
+            self.blocked_until = max(self.blocked_until, now + to_wait)
+
+    def summary(self) -> str:
+        """Returns a one line description of the limits in force and the time calls spent waiting."""
+        rate = f"{self.calls_per_window}/{self.window_sec}s" if self.calls_per_window else "unlimited"
+        concurrency = self.concurrency_limit or "unlimited"
+        return f"rate {rate}, concurrency {concurrency}, {self.calls} calls waited {self.total_wait:.1f}s in total"
+
+
+class QualysApiClient:
+    """
+    Reusable Qualys API client for one run.  Owns a pooled requests.Session so every call reuses a
+    keep-alive TCP+TLS connection, and builds the Basic auth headers and the retry policy once
+    instead of on every call.  Safe to share between the --workers threads; the pool blocks rather
+    than opening more than pool_size connections.
+
+    Args:
+        _q_api_fqdn (str): Fully qualified domain name of the Qualys API, or a URL with scheme.
+        _q_username (str): Qualys API username.
+        _q_password (str): Qualys API password.
+        pool_size (int): Maximum number of pooled connections (default: q_http_pool_size).
+        max_retries (int): Attempts per call (default: 10).
+        min_delay (int): First retry delay in seconds (default: 30).
+        max_delay (int): Last retry delay in seconds (default: 300).
+        rate_limiter (QualysRateLimiter): Run wide rate limiter that paces every call (optional).
+
+    Raises:
+        ValueError: If _q_api_fqdn, _q_username, or _q_password is empty.
+    """
+
+    retryable_status_codes = frozenset({409, 429} | set(range(500, 600)))  # HTTP status codes to retry
+
+    def __init__(self, _q_api_fqdn: str, _q_username: str, _q_password: str, pool_size: int = None,
+                 max_retries: int = 10, min_delay: int = 30, max_delay: int = 300,
+                 rate_limiter: Optional[QualysRateLimiter] = None):
+        # Validate inputs
+        if not _q_api_fqdn:
+            raise ValueError("Qualys API FQDN must be provided")
+        if not _q_username:
+            raise ValueError("Qualys API username must be provided")
+        if not _q_password:
+            raise ValueError("Qualys API password must be provided")
+
+        self.q_api_fqdn = _q_api_fqdn
+        self.q_username = _q_username
+        self.pool_size = pool_size or q_http_pool_size
+        self.max_retries = max_retries
+        self.retry_delays = compute_retry_delays(max_retries, min_delay, max_delay)
+        self.rate_limiter = rate_limiter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'X-Requested-With': x_requested_with,
+            'Content-Type': 'application/json',
+            'Connection': 'keep-alive',
+            'Authorization': get_basic_auth(_q_username, _q_password)
+        })
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        """Closes the pooled connections."""
+        self.session.close()
+
+    def url(self, _q_api_endpoint: str) -> str:
+        """Returns the URL for an API endpoint."""
+        return get_api_url(self.q_api_fqdn, _q_api_endpoint)
+
+    def post(self, _q_api_endpoint: str, _payload: str, _user_agent: str, _headers: Dict[str, str] = None) -> Response:
+        """
+        Sends one POST over the pooled session with the prebuilt headers and a per-call User-Agent.
+        With a rate limiter the call waits for a token and a concurrency slot first, and the
+        response headers update the limiter.
+        """
+        headers = {'User-Agent': _user_agent}
+        if _headers:
+            headers.update(_headers)
+        if self.rate_limiter is None:
+            return self.session.post(self.url(_q_api_endpoint), headers=headers, data=_payload)
+        self.rate_limiter.acquire()
+        response = None
+        try:
+            response = self.session.post(self.url(_q_api_endpoint), headers=headers, data=_payload)
+            return response
+        finally:
+            self.rate_limiter.release(response.headers if response is not None else None)
+
+
+class QualysPayloadBuilder:
+    """
+    Builds ServiceRequest JSON strings from payload_template_str without parsing and re-serializing the
+    template for every asset and batch.  The template is serialized once around placeholders and split
+    into fixed fragments; a payload is then the fragments with the asset ID list spliced in.  The
+    serialized custom attribute list of each distinct attribute set, and the request body tail of each
+    attribute set and operation, are cached.  The strings are identical to json.dumps of the template
+    dictionary with the same values.
+
+    Args:
+        _payload_template_str (str): ServiceRequest template JSON with one Criteria and an add operation.
+        cache_size (int): Maximum cached entries per cache, a full cache is cleared (default: q_payload_cache_size).
+    """
+
+    _ids_placeholder = '\x00asset_ids\x00'
+    _attributes_placeholder = '\x00custom_attributes\x00'
+
+    def __init__(self, _payload_template_str: str, cache_size: int = None):
+        self.cache_size = cache_size or q_payload_cache_size
+        template = json.loads(_payload_template_str)
+        template['ServiceRequest']['filters']['Criteria'][0]['value'] = self._ids_placeholder
+        ids_placeholder = json.dumps(self._ids_placeholder)
+
+        # Per asset payload of qualys_attribute_payloads, with the template's CustomAttribute list
+        self._asset_head, self._asset_tail = json.dumps(template).split(ids_placeholder)
+
+        # Batch body, the operation and the attribute list are spliced in after the asset IDs
+        template['ServiceRequest']['data']['Asset']['customAttributes'] = {'\x00operation\x00': {
+            'CustomAttribute': self._attributes_placeholder}}
+        self._body_head, body_tail = json.dumps(template).split(ids_placeholder)
+        self._body_tails = {operation: body_tail.replace(json.dumps('\x00operation\x00'), json.dumps(operation))
+                            for operation in ('add', 'update', 'remove')}
+        self._attributes_json = {}
+        self._attribute_hashes = {}
+        self._tails = {}
+
+    def asset_payload(self, asset_ids: str) -> str:
+        """Returns the qualys_attribute_payloads payload of an asset, the template with its asset IDs."""
+        return self._asset_head + json.dumps(asset_ids) + self._asset_tail
+
+    def custom_attributes(self, _custom_attributes: List[Dict[str, Any]]) -> str:
+        """
+        Returns the payload_custom_attributes JSON list of a row's key/value pairs, leaving out qualys_id
+        and empty values.
+        """
+        return self.custom_attribute_pairs((attribute['key'], attribute['value']) for attribute in _custom_attributes)
+
+    def custom_attribute_pairs(self, _pairs: Iterator[Tuple[str, Any]]) -> str:
+        """Returns the payload_custom_attributes JSON list of (key, value) pairs, as custom_attributes."""
+        cache_key = tuple((key, value) for key, value in _pairs if key != 'qualys_id' and value != '')
+        attributes_json = self._attributes_json.get(cache_key)
+        if attributes_json is None:
+            if len(self._attributes_json) >= self.cache_size:
+                self._attributes_json.clear()
+            attributes_json = json.dumps([{'key': key, 'value': value} for key, value in cache_key])
+            self._attributes_json[cache_key] = attributes_json
+        return attributes_json
+
+    def attributes_hash(self, payload_custom_attributes: str) -> str:
+        """Returns the attr_hash of a payload_custom_attributes JSON list, hash_custom_attributes cached."""
+        attribute_hash = self._attribute_hashes.get(payload_custom_attributes)
+        if attribute_hash is None:
+            if len(self._attribute_hashes) >= self.cache_size:
+                self._attribute_hashes.clear()
+            attribute_hash = hash_custom_attributes(payload_custom_attributes)
+            self._attribute_hashes[payload_custom_attributes] = attribute_hash
+        return attribute_hash
+
+    def batch_body(self, asset_ids: Union[str, List[str]], payload_custom_attributes: str,
+                   operation: str = 'add') -> str:
+        """
+        Returns the request body for a batch: the asset IDs, comma separated, and the payload_custom_attributes
+        JSON list under the add, update or remove operation.
+        """
+        if not isinstance(asset_ids, str):
+            asset_ids = ','.join(asset_ids)
+        cache_key = (payload_custom_attributes, operation)
+        tail = self._tails.get(cache_key)
+        if tail is None:
+            if operation not in self._body_tails:
+                raise ValueError("Operation must be 'update' or 'remove' or 'add'")
+            if len(self._tails) >= self.cache_size:
+                self._tails.clear()
+            # Round trip once per attribute set so the fragment matches json.dumps of the parsed list
+            attributes_json = json.dumps(json.loads(payload_custom_attributes or '[]'))
+            tail = self._body_tails[operation].replace(json.dumps(self._attributes_placeholder), attributes_json)
+            self._tails[cache_key] = tail
+        return self._body_head + json.dumps(asset_ids) + tail
+
+
+# Payload builder shared by the payload, split, transform and execute stages
+q_payload_builder = QualysPayloadBuilder(payload_template_str)
+
+
+class QualysRunDatabase:
+    """
+    The run database, opened once per run and passed to every workflow stage as _database.  The stages share
+    its one connection, so the storage profile pragmas are applied, the schema is loaded and the page cache is
+    warmed once per run.  The connection caches prepared statements by SQL text, so a statement prepared by
+    one stage is reused by the next.  Each stage runs in transaction(), which begins explicitly and commits
+    or rolls back what the stage has not committed itself.  The connection is opened with
+    check_same_thread=False for the ExecutionLogWriter thread of the execute stage.
+
+    With db_mode 'memory' the connection holds an in-memory database, loaded from db_path when the file
+    exists, as for --resume, and written to db_path with the SQLite backup API by close().
+
+    Args:
+        db_path (Path): Path to the SQLite database file.
+        storage_profile (str): Key of q_storage_profiles (default: safe).
+        db_mode (str): 'file' or 'memory' (default: file).
+        cached_statements (int): Prepared statements cached by the connection (default: q_statement_cache_size).
+        auto_vacuum (str): auto_vacuum mode of a new database file, set before the journal_mode of the
+                           profile writes the file header (default: SQLite default).
+    """
+
+    def __init__(self, db_path: Path, storage_profile: str = 'safe', db_mode: str = 'file',
+                 cached_statements: int = None, auto_vacuum: str = None):
+        self.db_path = Path(db_path)
+        self.storage_profile = storage_profile
+        self.db_mode = db_mode
+        cached_statements = cached_statements or q_statement_cache_size
+        if db_mode == 'memory':
+            self.conn = sqlite3.connect(':memory:', cached_statements=cached_statements, check_same_thread=False)
+            if self.db_path.exists():
+                with sqlite3.connect(self.db_path) as disk_conn:
+                    disk_conn.backup(self.conn)
+                disk_conn.close()
+                print(f"Loaded {self.db_path} into memory")
+        else:
+            self.conn = sqlite3.connect(self.db_path, cached_statements=cached_statements,
+                                        check_same_thread=False)
+        if auto_vacuum is not None:
+            self.conn.execute(f"PRAGMA auto_vacuum={auto_vacuum}")
+        for pragma, value in q_storage_profiles[storage_profile].items():
+            self.conn.execute(f"PRAGMA {pragma}={value}")
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Yields the connection in a transaction, committed on success and rolled back on error."""
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+        with self.conn:
+            yield self.conn
+
+    def close(self) -> None:
+        """Closes the connection, after writing the database to db_path with db_mode 'memory'."""
+        try:
+            if self.db_mode == 'memory':
+                start_time = time.perf_counter()
+                with sqlite3.connect(self.db_path) as disk_conn:
+                    self.conn.backup(disk_conn)
+                disk_conn.close()
+                print(f"Saved the in-memory database to {self.db_path} in "
+                      f"{time.perf_counter() - start_time:.2f} seconds")
+        except sqlite3.Error as e:
+            print(f"Database error saving the in-memory database to {self.db_path}: {e}")
+            raise WorkflowError(f"Error saving the in-memory database to {self.db_path}: {e}") from e
+        finally:
+            self.conn.close()
+
+
+class ExecutionLogWriter:
+    """
+    Writes the rows of the execute stage to the execution log table on a dedicated thread, so the thread
+    that dispatches the API calls does no SQLite or log formatting work.  Rows are queued by put() in the
+    order they are written, inserted with executemany and committed once commit_rows rows are pending or
+    the oldest pending row has waited commit_seconds.  A run that dies part way loses at most the rows of
+    one commit interval, whose batches --resume executes again.  The queue holds up to q_log_queue_size
+    rows, put() waits while it is full.  The writer prints the log line of each API call.  Any exception of
+    the writer thread stops the writing and is raised by the next put() or by close().
+
+    Args:
+        conn (sqlite3.Connection): Connection of the stage, opened with check_same_thread=False.
+        table_name (str): Name of the execution log table.
+        api_function (str): Function add, update, remove, for the log lines.
+        commit_rows (int): Pending rows that trigger a commit (default: q_log_commit_rows).
+        commit_seconds (float): Longest wait of a pending row for its commit (default: q_log_commit_seconds).
+    """
+
+    def __init__(self, conn: sqlite3.Connection, table_name: str, api_function: str, commit_rows: int = None,
+                 commit_seconds: float = None):
+        self.conn = conn
+        self.table_name = table_name
+        self.api_function = api_function
+        self.commit_rows = commit_rows or q_log_commit_rows
+        self.commit_seconds = commit_seconds or q_log_commit_seconds
+        self.insert_sql = f"INSERT INTO {table_name} (asset_ids, payload, payload_custom_attributes, " \
+                          f"count_asset_ids, group_number, batch_number, status, execution_log, attempts, " \
+                          f"outcome, sub_batch, parent_sub_batch) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+        self.queue = queue.Queue(maxsize=q_log_queue_size)
+        self.rows_queued = 0
+        self.rows_written = 0
+        self.commits = 0
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name="execution_log_writer", daemon=True)
+        self.thread.start()
+
+    def put(self, row: tuple, log_call: bool = False) -> None:
+        """Queues an execution log row, with log_call the API call is printed to the log."""
+        if self.error is not None:
+            raise WorkflowError(f"Execution log writer failed: {self.error}") from self.error
+        self.queue.put((row, log_call))
+
+    def close(self) -> None:
+        """Writes and commits the queued rows and stops the writer thread."""
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise WorkflowError(f"Execution log writer failed: {self.error}") from self.error
+
+    def _write(self, cursor: sqlite3.Cursor, pending: List[tuple]) -> None:
+        try:
+            cursor.executemany(self.insert_sql, pending)
+            self.conn.commit()
+        except Exception as e:
+            print(f"Error writing {len(pending)} rows into {self.table_name}: {e}")
+            self.error = e
+            return
+        reported = self.rows_written // 1000
+        self.rows_written += len(pending)
+        self.commits += 1
+        if self.rows_written // 1000 > reported:
+            print(f"Inserted {self.rows_written} rows into {self.table_name}")
+
+    def _run(self) -> None:
+        cursor = None
+        pending = []
+        commit_due = None
+        while True:
+            try:
+                item = self.queue.get(timeout=None if commit_due is None
+                                      else max(commit_due - time.monotonic(), 0.0))
+            except queue.Empty:
+                item = ()
+            # Any error stops the writing, not the thread: a failed writer keeps draining the queue until
+            # close(), so put() and close() never wait for it
+            try:
+                if self.error is None:
+                    if cursor is None:
+                        cursor = self.conn.cursor()
+                    if item:
+                        row, log_call = item
+                        self.rows_queued += 1
+                        pending.append(row)
+                        if commit_due is None:
+                            commit_due = time.monotonic() + self.commit_seconds
+                        if log_call:
+                            print(f"{datetime.now():%Y-%m-%d %H:%M:%S} | "
+                                  f"API Call Number: {self.rows_queued:>10,}, "
+                                  f"API Call Operation: {self.api_function}, "
+                                  f"API Status: {row[6]}. "
+                                  f"Attempts: {row[8]}. "
+                                  f"Execution log: {format_response_message(row[7])}")
+                    if pending and (item is None or item == () or len(pending) >= self.commit_rows):
+                        self._write(cursor, pending)
+                        pending = []
+                        commit_due = None
+            except Exception as e:
+                print(f"Execution log writer error in {self.table_name}: {e}")
+                self.error = e
+            if self.error is not None:
+                pending = []
+                commit_due = None
+            if item is None:
+                return
+
+
 #
 # BEGIN Functions
 #
@@ -143,8 +678,16 @@ def check_required_modules() -> None:
         "os",
         "json",
         "base64",
+        "hashlib",
+        "gzip",
+        "bz2",
+        "lzma",
         "datetime",
         "time",
+        "threading",
+        "heapq",
+        "random",
+        "email",
     ]
 
     missing_modules = []
@@ -192,7 +735,8 @@ Database Table Descriptions
 
 The application creates several SQLite database tables to process and manage data from a CSV file,
 generate Qualys API payloads, and log API execution results. Below is a description of each table,
-its purpose, and its schema.
+its purpose, and its schema.  With --pipeline streaming only the execution log table is written, plus
+qualys_attribute_payloads_duplicates and qualys_attribute_payloads_transformed with --audit-tables.
 
 1. axonious_data
    - Purpose: Stores cleaned and transformed data from the input CSV file. Each row represents a
@@ -223,16 +767,22 @@ its purpose, and its schema.
        custom attributes.
      - payload_custom_attributes (TEXT): The JSON string containing the list of custom attributes
        (key-value pairs) to be applied to the asset.
+     - asset_key (TEXT): The asset ID without BOM characters and surrounding whitespace, upper cased.
+       Computed at insert time and indexed; duplicates are detected and removed on this column.
+     - attr_hash (TEXT): SHA-1 of the custom attributes sorted by key. Computed at insert time;
+       grouping runs on this column, indexed on the table grouping reads from.
 
 3. qualys_attribute_payloads_duplicates
-   - Purpose: Identifies and stores rows from the qualys_attribute_payloads table where asset IDs
-     appear multiple times, indicating potential duplicates. This table is used for data validation
-     and debugging to ensure no asset ID is processed with conflicting custom attributes.
+   - Purpose: Compact report of the rows from the qualys_attribute_payloads table whose asset_key
+     appears multiple times, indicating potential duplicates. It is written by the same stage as
+     qualys_attribute_payloads_clean and is used for data validation and debugging to ensure no asset
+     ID is processed with conflicting custom attributes.
    - Schema:
-     - asset_id (TEXT): The Qualys asset ID (cleaned of BOM characters).
-     - payload (TEXT): The JSON string representing the Qualys API payload for the asset.
+     - asset_id (TEXT): The Qualys asset ID.
      - payload_custom_attributes (TEXT): The JSON string containing the custom attributes for the
        asset.
+     - asset_key (TEXT), attr_hash (TEXT): As in qualys_attribute_payloads.
+     - duplicate_count (INTEGER): The number of rows with this asset_key.
        
 3.1 qualys_attribute_payloads_clean
    - Purpose: deduplicated rows from the qualys_attribute_payloads table where asset IDs
@@ -243,20 +793,73 @@ its purpose, and its schema.
      - payload (TEXT): The JSON string representing the Qualys API payload for the asset.
      - payload_custom_attributes (TEXT): The JSON string containing the custom attributes for the
        asset.
+     - asset_key (TEXT), attr_hash (TEXT): As in qualys_attribute_payloads.
+
+3.2 qualys_attribute_payloads_delta
+   - Purpose: Only created in delta mode (--baseline-db). Rows from qualys_attribute_payloads_clean
+     whose asset ID is new, or whose hashed custom attributes changed, compared to the baseline
+     run's qualys_attribute_payloads_applied table (for older baselines, the batches that succeeded in
+     its execution log). Grouping reads from this table instead of qualys_attribute_payloads_clean.
+   - Schema:
+     - asset_id (TEXT): The Qualys asset ID.
+     - payload (TEXT): The JSON string representing the Qualys API payload for the asset.
+     - payload_custom_attributes (TEXT): The JSON string containing the custom attributes for the
+       asset.
+     - change_type (TEXT): 'new' if the asset was not applied by the baseline run, 'changed' if its
+       custom attributes differ from the baseline.
+     - asset_key (TEXT), attr_hash (TEXT): As in qualys_attribute_payloads.
+
+3.3 qualys_asset_current_attributes
+   - Purpose: Only created with --prefetch. The custom attributes Qualys currently holds for each
+     asset ID to be processed, read from the asset search API.
+   - Schema:
+     - asset_id (TEXT): The Qualys asset ID.
+     - custom_attributes (TEXT): JSON object of the current custom attribute keys and values.
+
+3.4 qualys_attribute_payloads_pending
+   - Purpose: Only created with --prefetch. Rows of the previous table (qualys_attribute_payloads_clean,
+     or qualys_attribute_payloads_delta in delta mode) whose API call would change Qualys. Assets whose
+     target attributes already match qualys_asset_current_attributes are dropped. Grouping reads from
+     this table.
+   - Schema: Same as the previous table.
+
+3.5 qualys_attribute_payloads_optimized
+   - Purpose: Only created with --optimize-grouping. Rows of the previous table regrouped by the plan
+     with the fewest predicted API calls: the full attribute tuple (rows copied unchanged), one block
+     per key/value pair, or blocks of partial key subsets. An asset has one row per key block it holds
+     values for, with the attributes of that block only. Grouping reads from this table.
+   - Schema:
+     - asset_id (TEXT): The Qualys asset ID.
+     - payload (TEXT): The JSON string representing the Qualys API payload for the asset.
+     - payload_custom_attributes (TEXT): The JSON string containing the custom attributes of one key
+       block for the asset.
+     - asset_key (TEXT), attr_hash (TEXT): As in qualys_attribute_payloads, attr_hash of the key block.
 
 4. qualys_attribute_payloads_grouped
    - Purpose: Groups rows from the qualys_attribute_payloads table by unique sets of custom
      attributes, aggregating asset IDs into a comma-separated list. Each row represents a unique
      combination of custom attributes with associated asset IDs, along with a count of asset IDs
-     and a group number for tracking.
+     and a group number for tracking. For --api-function remove, rows are grouped by their set of
+     keys alone, since values do not matter to remove, and payload_custom_attributes holds only the keys.
    - Schema:
      - asset_ids (TEXT): A comma-separated list of Qualys asset IDs sharing the same custom attributes.
+       NULL with --asset-id-type integer, see qualys_attribute_payloads_group_members.
      - payload (TEXT): The JSON string representing the Qualys API payload for the group.
      - payload_custom_attributes (TEXT): The JSON string containing the custom attributes for the
        group.
      - count_asset_ids (INTEGER): The number of asset IDs in the asset_ids field.
      - group_number (INTEGER): A unique identifier for each group, based on the row ID.
 
+4.1 qualys_attribute_payloads_group_members
+   - Purpose: Only created with --asset-id-type integer. The asset IDs of each group of
+     qualys_attribute_payloads_grouped, one row per asset. The split stage slices each group's batches
+     from this table in ascending asset ID order with ROW_NUMBER. In this mode asset_id is also
+     declared INTEGER in qualys_attribute_payloads and qualys_attribute_payloads_clean.
+   - Schema:
+     - group_number (INTEGER): The group_number of qualys_attribute_payloads_grouped.
+     - asset_id (INTEGER): The Qualys asset ID.
+     - Primary key (group_number, asset_id), WITHOUT ROWID, so the table is its own covering index.
+
 5. qualys_attribute_payloads_split
    - Purpose: Splits rows from the qualys_attribute_payloads_grouped table into multiple rows if the
      number of asset IDs exceeds a specified limit (default: 5). Each row contains at most the
@@ -301,6 +904,59 @@ its purpose, and its schema.
      - batch_number (INTEGER): The batch number inherited from the previous table.
      - status (TEXT): The status of the API call (initially 'none').
      - execution_log (TEXT): The log of the API call execution (initially 'none').
+     - attempts (INTEGER): The number of attempts made for the batch, including deferred retries.
+     - outcome (TEXT): The final outcome of the batch: 'success', 'bisected', 'failed', 'retries_exhausted' or 'dry_run'.
+     - sub_batch (TEXT): Empty for a batch from the transformed table.  A batch that Qualys rejects is split
+       into halves numbered '1' and '2', their halves '1.1', '1.2' and so on, until the bad asset IDs are isolated.
+     - parent_sub_batch (TEXT): The sub_batch of the bisected batch a sub batch was split from, NULL for a
+       batch from the transformed table.  Together with group_number and batch_number it links a sub batch to its parent.
+
+7.1 qualys_attribute_payloads_applied
+   - Purpose: The custom attributes applied successfully per asset, the baseline state carried forward in
+     delta mode plus the assets of the successful batches of this run.  Written at the end of the execute
+     stage; --baseline-db reads it, so a chain of delta runs each only sends what changed.
+   - Schema:
+     - api_function (TEXT): The --api-function that applied the attributes.
+     - asset_id (TEXT): The Qualys asset ID.  Primary key with api_function.
+     - payload_custom_attributes (TEXT): The JSON string of the custom attributes applied to the asset.
+
+8. storage_settings
+   - Purpose: The --storage-profile of the run and the SQLite pragmas it applies to every connection of the
+     database.  Written before the first stage; a --resume run records its own profile.
+   - Schema:
+     - setting (TEXT): 'storage_profile', 'journal_mode', 'synchronous', 'cache_size', 'temp_store' or
+       'mmap_size'.  Primary key.
+     - requested (TEXT): The value of the profile.
+     - applied (TEXT): The value SQLite reports back, e.g. 'wal' for journal_mode or 1 for synchronous NORMAL.
+       NULL for mmap_size with --db-mode memory.
+
+9. runs
+   - Purpose: With --persistent-db, one row per run kept in the database file.  The stage tables above are
+     dropped at the start of each run and hold the latest run only; runs, run_execution_log and
+     run_duplicates keep every run within --retention-days and --retention-runs.
+     qualys_attribute_payloads_applied is kept across runs and never pruned; --baseline-db reads it.
+   - Schema:
+     - run_id (INTEGER): Run number, primary key.  A --resume continues the latest run_id.
+     - started_at, ended_at (TEXT): Start and end time of the run.
+     - status (TEXT): 'running', 'success' or 'failed'.
+     - seconds (REAL): Wall time of the run, summed over --resume attempts.
+     - csv_file, api_function (TEXT), dry_run (INTEGER): Input file, --api-function and dry run flag.
+     - options (TEXT): JSON of the run options.
+     - stage_seconds (TEXT): JSON of the seconds spent in each workflow stage.
+     - summary (TEXT): JSON of the run summary printed at the end of the run.
+     - resumed (INTEGER): Number of --resume attempts.
+
+10. run_execution_log
+   - Purpose: The qualys_attribute_payloads_transformed_execution_log of every run, without the payload
+     column, archived at the end of the run.
+   - Schema: run_id (INTEGER) and the execution log columns asset_ids, payload_custom_attributes,
+     count_asset_ids, group_number, batch_number, status, execution_log, attempts, outcome, sub_batch and
+     parent_sub_batch.  Indexed on (run_id, group_number, batch_number).
+
+11. run_duplicates
+   - Purpose: The qualys_attribute_payloads_duplicates table of every run, archived at the end of the run.
+   - Schema: run_id (INTEGER) and the duplicates columns asset_id, payload_custom_attributes, asset_key,
+     attr_hash and duplicate_count.  Indexed on run_id.
 """)
 
 def print_usage() -> None:
@@ -326,13 +982,61 @@ will throttle itself and will wait and retry in the event of concurrency or conn
 
 Options:
   -c, --csv-file PATH      Path to the input CSV file (required, must exist, default: {q_csv_file})
+                           gzip, bz2 and xz compressed files are decompressed as a stream
   -d, --dry-run            Do not execute any API calls.
+  --baseline-db PATH       Delta mode, only send assets that are new or changed since the run stored in PATH
+                           (the database file of the last run with the same --api-function, itself a delta run
+                           or not, or a --persistent-db file, which holds the runs of every --api-function)
+  --prefetch               Read current custom attributes from the asset search API and skip assets
+                           that already match (not used with --dry-run)
+  --optimize-grouping      Predict the API calls of grouping by the full attribute tuple, by single key/value
+                           pairs and by partial key subsets, and send the plan with the fewest calls
+  --workers N              Number of API calls to run concurrently (default: 1)
+  --rate-limit N           Subscription API calls per hour. Calls are paced to stay under the limit, which is
+                           updated from the X-RateLimit-* response headers (default: learned from headers)
+  --concurrency-limit N    Subscription concurrent API calls, updated from the X-Concurrency-Limit-* response
+                           headers (default: learned from headers)
+  --resume PATH            Continue the execute stage of the run stored in the database file PATH. Uses its
+                           qualys_attribute_payloads_transformed table and executes only batches not yet done
+  --max-asset-ids N        Maximum number of asset IDs per API call (default: 100)
+  --max-body-bytes N       Maximum API request body size in bytes.  Each call is packed with asset IDs until the
+                           serialized body reaches N bytes or --max-asset-ids IDs, whichever comes first
+                           (default: no size limit, --max-asset-ids IDs per call)
+  --pipeline MODE          materialized writes a table for every stage for forensic runs, streaming reads the CSV
+                           in one pass and runs dedup, grouping, split and transform in memory, writing only the
+                           execution log (default: materialized). Not used with --baseline-db, --prefetch or
+                           --optimize-grouping
+  --audit-tables           With --pipeline streaming, also write qualys_attribute_payloads_duplicates and
+                           qualys_attribute_payloads_transformed (needed for --resume)
+  --asset-id-type TYPE     text stores asset IDs as TEXT and group membership as comma-separated lists, integer
+                           stores them as INTEGER, group membership in qualys_attribute_payloads_group_members
+                           and slices batches in SQL (default: text). Not used with --pipeline streaming
+  --storage-profile NAME   SQLite settings of the run database (default: safe):
+                           - safe - rollback journal, synchronous FULL, 2 MB cache, SQLite defaults.
+                           - fast - WAL journal, synchronous NORMAL, 64 MB cache, temp tables in memory,
+                                    256 MB mmap. Committed stages survive a crash, a power loss may lose
+                                    the last commits.
+                           - bulk - journal in memory, synchronous OFF, 256 MB cache, temp tables in memory,
+                                    1 GB mmap. A crash can corrupt the database, so it is not for --resume.
+  --db-mode MODE           file writes every stage to the database file, memory runs the whole workflow against
+                           an in-memory database and writes it to the database file with the SQLite backup API
+                           at the end of the run or on failure (default: file). memory needs RAM for the whole
+                           database and loses it if the process is killed
+  --persistent-db PATH     Run in the database file PATH, kept across runs, instead of a new timestamped file.
+                           Every run is recorded in the runs, run_execution_log and run_duplicates tables,
+                           the stage tables hold the latest run. Resume it with --resume PATH. Not used with
+                           --db-mode memory or --storage-profile bulk, also not when resumed
+  --retention-days N       With --persistent-db, delete runs started more than N days ago, 0 keeps all
+                           (default: 90)
+  --retention-runs N       With --persistent-db, keep only the last N runs (default: all)
+  --parse-workers N        Number of processes used to parse the CSV file, 0 for one per CPU core (default: 1)
   --db-help                Show database table descriptions and exit
   -a, --api-fqdn FQDN      Qualys API fully qualified domain name (default: qualysapi.qg3.apps.qualys.com)
   -f, --api-function FUNC  Qualys API function to perform on assets custom attributes: add, update, or remove (default: add)
                            - add    - add custom attribute key/data pair from csv-file if the key does not exist.
                            - update - update custom attribute key/data pair if the key exists.
                            - remove - remove custom attribute key/data pair if the key exists.
+                                      Assets are batched by key set alone, values are not sent.
   -h, --help               Show this help message and exit
 
 Environment Variables:
@@ -370,13 +1074,14 @@ Note:
 
 
 
-def get_config() -> tuple[Path, Path, str, str, str, str, bool]:
+def get_config() -> tuple[Path, Path, str, str, str, str, bool, Dict[str, Any]]:
     """
     Processes command-line arguments and environment variables to configure file paths and Qualys API settings.
 
     Returns:
-        tuple[Path, Path, str, str, str, str]: Paths to the input CSV file, SQLite database file, Qualys API FQDN,
-                                              API function, username, and password.
+        tuple[Path, Path, str, str, str, str, bool, Dict[str, Any]]: Paths to the input CSV file, SQLite database
+                                              file, Qualys API FQDN, username, password, API function,
+                                              dry run flag, and run options (see q_run_options).
 
     Raises:
         ValueError: If any required configurations are invalid or missing.
@@ -385,6 +1090,7 @@ def get_config() -> tuple[Path, Path, str, str, str, str, bool]:
     default_csv_file = q_csv_file
     _db_file = q_database_file
     _dry_run = False
+    _run_options = dict(q_run_options)
     default_api_fqdn = 'qualysapi.qg3.apps.qualys.com'
     default_api_function = 'add'
 
@@ -426,6 +1132,111 @@ def get_config() -> tuple[Path, Path, str, str, str, str, bool]:
         action='store_true',
         help='Dry Run, create database but do not run API calls.'
     )
+    parser.add_argument(
+        '--baseline-db',
+        type=Path,
+        default=None,
+        help='Delta mode, only send assets that are new or changed since the run stored in this database file'
+    )
+    parser.add_argument(
+        '--prefetch',
+        action='store_true',
+        help='Read current custom attributes from Qualys and skip assets that already match'
+    )
+    parser.add_argument(
+        '--optimize-grouping',
+        action='store_true',
+        help='Send custom attribute keys in the grouping plan with the fewest predicted API calls'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=q_run_options['workers'],
+        help='Number of API calls to run concurrently (default: 1)'
+    )
+    parser.add_argument(
+        '--rate-limit',
+        type=int,
+        default=None,
+        help='Subscription API calls per hour, updated from X-RateLimit-* response headers (default: learned)'
+    )
+    parser.add_argument(
+        '--concurrency-limit',
+        type=int,
+        default=None,
+        help='Subscription concurrent API calls, updated from X-Concurrency-Limit-* response headers (default: learned)'
+    )
+    parser.add_argument(
+        '--resume',
+        type=Path,
+        default=None,
+        help='Continue the execute stage of the run stored in this database file, skipping batches already done'
+    )
+    parser.add_argument(
+        '--max-asset-ids',
+        type=int,
+        default=q_run_options['max_asset_ids'],
+        help='Maximum number of asset IDs per API call (default: 100)'
+    )
+    parser.add_argument(
+        '--max-body-bytes',
+        type=int,
+        default=None,
+        help='Maximum API request body size in bytes, packs each call up to this size or --max-asset-ids'
+    )
+    parser.add_argument(
+        '--pipeline',
+        choices=['materialized', 'streaming'],
+        default=q_run_options['pipeline'],
+        help='materialized writes every stage table, streaming runs the stages in memory (default: materialized)'
+    )
+    parser.add_argument(
+        '--audit-tables',
+        action='store_true',
+        help='With --pipeline streaming, also write the duplicates and transformed tables'
+    )
+    parser.add_argument(
+        '--asset-id-type',
+        choices=['text', 'integer'],
+        default=q_run_options['asset_id_type'],
+        help='Store asset IDs as TEXT or INTEGER, integer adds the group membership table (default: text)'
+    )
+    parser.add_argument(
+        '--storage-profile',
+        choices=list(q_storage_profiles),
+        default=q_run_options['storage_profile'],
+        help='SQLite journal, sync, cache and mmap settings of the run database (default: safe)'
+    )
+    parser.add_argument(
+        '--db-mode',
+        choices=['file', 'memory'],
+        default=q_run_options['db_mode'],
+        help='file writes every stage to the database file, memory runs in RAM and saves the file at the end'
+    )
+    parser.add_argument(
+        '--persistent-db',
+        type=Path,
+        default=None,
+        help='Run in this database file, kept across runs with the history of every run, instead of a new file'
+    )
+    parser.add_argument(
+        '--retention-days',
+        type=int,
+        default=q_run_options['retention_days'],
+        help='With --persistent-db, prune runs started more than N days ago, 0 keeps all (default: 90)'
+    )
+    parser.add_argument(
+        '--retention-runs',
+        type=int,
+        default=None,
+        help='With --persistent-db, keep only the last N runs (default: all runs within --retention-days)'
+    )
+    parser.add_argument(
+        '--parse-workers',
+        type=int,
+        default=q_run_options['parse_workers'],
+        help='Number of processes used to parse the CSV file, 0 for one per CPU core (default: 1)'
+    )
 
     # Parse arguments
     args = parser.parse_args()
@@ -482,9 +1293,107 @@ def get_config() -> tuple[Path, Path, str, str, str, str, bool]:
     if _api_function.lower() not in valid_functions:
         errors.append(f"Invalid Qualys API function '{_api_function}'; must be one of: {', '.join(valid_functions)}. Provide via --api-function or q_api_function.")
 
-    # Validate CSV file (mandatory, must exist)
-    if not _csv_file.exists():
-        errors.append(f"Missing or invalid CSV file path: {_csv_file} does not exist. Provide via --csv-file or q_csv_file.")
+    _run_options['prefetch'] = args.prefetch
+    _run_options['optimize_grouping'] = args.optimize_grouping
+
+    # Validate concurrent API calls
+    if args.workers < 1:
+        errors.append(f"Invalid --workers {args.workers}; must be 1 or greater.")
+    else:
+        _run_options['workers'] = args.workers
+
+    # Validate subscription limits
+    for option, value in (('rate-limit', args.rate_limit), ('concurrency-limit', args.concurrency_limit)):
+        if value is not None and value < 1:
+            errors.append(f"Invalid --{option} {value}; must be 1 or greater.")
+        else:
+            _run_options[option.replace('-', '_')] = value
+
+    # Validate batch packing limits
+    if args.max_asset_ids < 1:
+        errors.append(f"Invalid --max-asset-ids {args.max_asset_ids}; must be 1 or greater.")
+    else:
+        _run_options['max_asset_ids'] = args.max_asset_ids
+    if args.max_body_bytes is not None and args.max_body_bytes < 1:
+        errors.append(f"Invalid --max-body-bytes {args.max_body_bytes}; must be 1 or greater.")
+    else:
+        _run_options['max_body_bytes'] = args.max_body_bytes
+
+    # Validate pipeline mode, streaming has no stage tables for the delta, prefetch and optimizer stages
+    _run_options['pipeline'] = args.pipeline
+    _run_options['audit_tables'] = args.audit_tables
+    if args.pipeline == 'streaming':
+        for option, value in (('baseline-db', args.baseline_db), ('prefetch', args.prefetch),
+                              ('optimize-grouping', args.optimize_grouping)):
+            if value:
+                errors.append(f"Invalid --{option} with --pipeline streaming; use --pipeline materialized.")
+    elif args.audit_tables:
+        errors.append("Invalid --audit-tables; only used with --pipeline streaming.")
+    _run_options['asset_id_type'] = args.asset_id_type
+    _run_options['storage_profile'] = args.storage_profile
+    _run_options['db_mode'] = args.db_mode
+    if args.asset_id_type == 'integer' and args.pipeline == 'streaming':
+        errors.append("Invalid --asset-id-type integer with --pipeline streaming, which writes no stage tables.")
+
+    # Validate CSV parser processes
+    if args.parse_workers < 0:
+        errors.append(f"Invalid --parse-workers {args.parse_workers}; must be 0 (one per CPU core) or greater.")
+    else:
+        _run_options['parse_workers'] = args.parse_workers or os.cpu_count() or 1
+
+    # Validate persistent database, which replaces the timestamped database file of the run
+    if args.persistent_db is not None:
+        if args.resume is not None:
+            errors.append("Invalid --persistent-db with --resume; resume the persistent database with --resume alone.")
+        elif args.db_mode == 'memory':
+            errors.append("Invalid --persistent-db with --db-mode memory, which would load every run into memory.")
+        elif args.storage_profile == 'bulk':
+            errors.append("Invalid --persistent-db with --storage-profile bulk, a crash could corrupt the run history.")
+        else:
+            _run_options['persistent_db'] = args.persistent_db
+            _db_file = args.persistent_db
+    for option, value in (('retention-days', args.retention_days), ('retention-runs', args.retention_runs)):
+        if value is not None and value < 0:
+            errors.append(f"Invalid --{option} {value}; must be 0 or greater.")
+        else:
+            _run_options[option.replace('-', '_')] = value
+    if args.retention_runs is not None and args.persistent_db is None:
+        errors.append("Invalid --retention-runs; only used with --persistent-db.")
+
+    # Validate baseline database for delta mode, a persistent database can be its own baseline from its first run
+    if args.baseline_db is not None:
+        if args.persistent_db is not None and args.baseline_db.resolve() == _db_file.resolve():
+            _run_options['baseline_db'] = args.baseline_db
+        elif not args.baseline_db.exists():
+            errors.append(f"Invalid --baseline-db: {args.baseline_db} does not exist.")
+        elif args.baseline_db.resolve() == _db_file.resolve():
+            errors.append(f"Invalid --baseline-db: {args.baseline_db} is the database file of this run.")
+        else:
+            _run_options['baseline_db'] = args.baseline_db
+
+    # Validate resume database, which replaces the CSV file as input
+    if args.resume is not None:
+        if not args.resume.exists():
+            errors.append(f"Invalid --resume: {args.resume} does not exist.")
+        elif not os.access(args.resume, os.W_OK):
+            errors.append(f"Invalid --resume: {args.resume} is not writable.")
+        elif args.storage_profile == 'bulk' and resume_has_run_history(args.resume):
+            errors.append(f"Invalid --resume of the persistent database {args.resume} with --storage-profile bulk, "
+                          f"a crash could corrupt the run history.")
+        else:
+            _run_options['resume_db'] = args.resume
+            _db_file = args.resume
+
+    # Validate CSV file (mandatory unless resuming, must exist, compressed files must decode)
+    if args.resume is None:
+        if not _csv_file.exists():
+            errors.append(f"Missing or invalid CSV file path: {_csv_file} does not exist. Provide via --csv-file or q_csv_file.")
+        else:
+            try:
+                with open_csv_file(_csv_file) as file:
+                    file.readline()
+            except (OSError, EOFError, lzma.LZMAError, UnicodeDecodeError) as e:
+                errors.append(f"Invalid CSV file: {_csv_file} can not be read as a plain, gzip, bz2 or xz CSV file: {e}")
 
     # Validate database file path (may not exist, but parent directory must be writable)
     if not os.access(_db_file.parent, os.W_OK):
@@ -497,7 +1406,87 @@ def get_config() -> tuple[Path, Path, str, str, str, str, bool]:
         print(error_message)
         sys.exit(1)
 
-    return _csv_file, _db_file, _api_fqdn, _q_username, _q_password, _api_function.lower(), _dry_run
+    return _csv_file, _db_file, _api_fqdn, _q_username, _q_password, _api_function.lower(), _dry_run, _run_options
+
+
+def detect_csv_compression(file_path: Union[str, Path]) -> Optional[str]:
+    """
+    Detects a compressed CSV input from its magic bytes.
+
+    Returns:
+        Optional[str]: 'gzip', 'bz2' or 'xz', or None for an uncompressed file.
+    """
+    with open(file_path, mode='rb') as file:
+        magic = file.read(6)
+    for prefix, compression in csv_compression_magic.items():
+        if magic.startswith(prefix):
+            return compression
+    return None
+
+
+def open_csv_file(file_path: Union[str, Path]):
+    """
+    Opens the input CSV file as a UTF-8 text stream.  gzip, bz2 and xz (lzma) files are decompressed
+    on the fly while reading, so compressed exports never need to be expanded to disk first.
+
+    Args:
+        file_path (Union[str, Path]): Path to the plain or compressed CSV file.
+
+    Returns:
+        A text file object suitable for csv.reader (newline='' semantics).
+    """
+    compression = detect_csv_compression(file_path)
+    if compression == 'gzip':
+        return gzip.open(file_path, mode='rt', newline='', encoding='utf-8')
+    if compression == 'bz2':
+        return bz2.open(file_path, mode='rt', newline='', encoding='utf-8')
+    if compression == 'xz':
+        return lzma.open(file_path, mode='rt', newline='', encoding='utf-8')
+    return open(file_path, mode='r', newline='', encoding='utf-8')
+
+
+def read_csv_fieldnames(file) -> List[str]:
+    """
+    Reads the header line of an open CSV file, removes BOM, quote and whitespace characters from each
+    field name and validates the result against csv_data_contract.
+
+    Args:
+        file: Text file object positioned at the start of the CSV file.
+
+    Returns:
+        List[str]: Cleaned field names in file order.
+
+    Raises:
+        ValueError: If the file is empty, has no headers or misses required fields.
+    """
+    # Read the first line manually to extract and clean fieldnames
+    first_line = file.readline()
+    if not first_line:
+        raise ValueError("CSV file is empty")
+
+    # Parse the first line as CSV to get raw fieldnames
+    header_reader = csv.reader(io.StringIO(first_line))
+    fieldnames = next(header_reader)
+
+    if not fieldnames:
+        raise ValueError("CSV file has no headers")
+
+    cleaned_fieldnames = []
+    for name in fieldnames:
+        # Remove BOM and control characters
+        cleaned_name = ''.join(char for char in name if char != '\ufeff')
+        cleaned_name_no_quote = ''.join(char for char in cleaned_name if char != '"')
+        cleaned_name = cleaned_name_no_quote.strip()
+        cleaned_fieldnames.append(cleaned_name)
+
+    # Validate that all required fields from csv_data_contract exist
+    required_fields = set(csv_data_contract.keys())
+    actual_fields = set(cleaned_fieldnames)
+    missing_fields = required_fields - actual_fields
+    if missing_fields:
+        raise ValueError(f"Broken Contract, input CSV file missing required fields: {', '.join(sorted(missing_fields))}")
+
+    return cleaned_fieldnames
 
 
 def iterate_over_csv_rows_returning_one_row_at_a_time(file_path: Union[str, Path]) -> Iterator[Dict[str, Any]]:
@@ -505,33 +1494,8 @@ def iterate_over_csv_rows_returning_one_row_at_a_time(file_path: Union[str, Path
     if not file_path.exists():
         raise FileNotFoundError(f"CSV file not found: {file_path}")
     try:
-        with open(file_path, mode='r', newline='', encoding='utf-8') as file:
-            # Read the first line manually to extract and clean fieldnames
-            first_line = file.readline()
-            if not first_line:
-                raise ValueError("CSV file is empty")
-
-            # Parse the first line as CSV to get raw fieldnames
-            header_reader = csv.reader(io.StringIO(first_line))
-            fieldnames = next(header_reader)
-
-            if not fieldnames:
-                raise ValueError("CSV file has no headers")
-
-            cleaned_fieldnames = []
-            for name in fieldnames:
-                # Remove BOM and control characters
-                cleaned_name = ''.join(char for char in name if char != '\ufeff')
-                cleaned_name_no_quote = ''.join(char for char in cleaned_name if char != '"')
-                cleaned_name = cleaned_name_no_quote.strip()
-                cleaned_fieldnames.append(cleaned_name)
-
-            # Validate that all required fields from csv_data_contract exist
-            required_fields = set(csv_data_contract.keys())
-            actual_fields = set(cleaned_fieldnames)
-            missing_fields = required_fields - actual_fields
-            if missing_fields:
-                raise ValueError(f"Broken Contract, input CSV file missing required fields: {', '.join(sorted(missing_fields))}")
+        with open_csv_file(file_path) as file:
+            cleaned_fieldnames = read_csv_fieldnames(file)
 
             # Now create DictReader with cleaned fieldnames, reading from the remaining file content
             reader = csv.DictReader(file, fieldnames=cleaned_fieldnames)
@@ -540,148 +1504,656 @@ def iterate_over_csv_rows_returning_one_row_at_a_time(file_path: Union[str, Path
                 yield dict(_row)
     except csv.Error as e:
         raise csv.Error(f"Error parsing CSV file: {e}")
+    except (OSError, EOFError, lzma.LZMAError) as e:
+        raise ValueError(f"Error decompressing CSV file {file_path}: {e}")
 
 
-def create_axonius_table(_csv_data_file):
-    try:
-        # Open the SQLite database
-        with sqlite3.connect(q_database_file) as conn:
-            cursor = conn.cursor()
-
-            cursor.execute(f'''DROP TABLE IF EXISTS {axonious_table_name}''')
-            # Create the table if it doesn't exist (using simplified column names)
-            cursor.execute(f'''CREATE TABLE IF NOT EXISTS {axonious_table_name} 
-                              (
-                                  qualys_id
-                                  TEXT,
-                                  Business
-                                  TEXT,
-                                  Division
-                                  TEXT,
-                                  Product_Group
-                                  TEXT,
-                                  Portfolio
-                                  TEXT,
-                                  Product
-                                  TEXT,
-                                  Primary_Service
-                                  TEXT,
-                                  Service_Owner_Group
-                                  TEXT,
-                                  Device_Owner_Group
-                                  TEXT,
-                                  Recovery_Tier
-                                  TEXT,
-                                  SLA
-                                  TEXT
-                              )''')
+def normalize_csv_value(value: Optional[str]) -> str:
+    """
+    Strips leading/trailing whitespace and replaces each run of newlines with a single comma.
+    Equivalent to re.sub(r'\n+', ',', value.strip()) without the regex engine; values without
+    embedded newlines (the common case) are returned after the strip alone.
+    """
+    if not value:
+        return ''
+    value = value.strip()
+    if '\n' not in value:
+        return value
+    return ','.join(part for part in value.split('\n') if part)
 
-            # Iterate over CSV rows one at a time and insert into the database
-            for _row in iterate_over_csv_rows_returning_one_row_at_a_time(_csv_data_file):
-                qualys_asset_ids = re.sub(r'\n+', ',', _row.get('Qualys Scans: Qualys ID', '').strip())
-                asset_id_list = [asset_id.strip() for asset_id in qualys_asset_ids.split(',') if asset_id.strip()]
 
-                for asset_id in asset_id_list:
-                    cursor.execute(
-                        f'''INSERT INTO {axonious_table_name} (qualys_id,
-                                             Business, Division, Product_Group, Portfolio,
-                                             Product, Primary_Service, Service_Owner_Group, Device_Owner_Group,
-                                             Recovery_Tier, SLA)
-                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                        (
-                            asset_id,
-                            re.sub(r'\n+', ',', _row.get('Mssql: MSSQL_ Business_Name', '').strip()) or "",
-                            re.sub(r'\n+', ',', _row.get('Mssql: MSSQL_ Div_Name', '').strip()) or "",
-                            re.sub(r'\n+', ',', _row.get('Mssql: MSSQL_ Productgroup', '').strip()) or "",
-                            re.sub(r'\n+', ',', _row.get('Mssql: MSSQL_ Portfolio', '').strip()) or "",
-                            re.sub(r'\n+', ',', _row.get('Mssql: MSSQL_ Product', '').strip()) or "",
-                            re.sub(r'\n+', ',', _row.get('Mssql: MSSQL_ Primaryservice', '').strip()) or "",
-                            re.sub(r'\n+', ',', _row.get('Mssql: MSSQL_ Serviceownergroup', '').strip()) or "",
-                            re.sub(r'\n+', ',', _row.get('Mssql: MSSQL_ Deviceownergroup', '').strip()) or "",
-                            re.sub(r'\n+', ',', _row.get('Mssql: MSSQL_ Recoverytier', '').strip()) or "",
-                            re.sub(r'\n+', ',', _row.get('Mssql: MSSQL_ Sla', '').strip()) or ""
-                        ))
+def get_axonius_column_projection(cleaned_fieldnames: List[str]) -> Tuple[int, List[int]]:
+    """
+    Maps csv_data_contract onto the positions of the CSV columns, computed once per file.
 
-            # Commit all inserts after processing all rows
-            conn.commit()
-            print("Data successfully inserted into the database.")
+    Args:
+        cleaned_fieldnames (List[str]): Cleaned CSV header as returned by read_csv_fieldnames.
 
-    except (FileNotFoundError, ValueError, csv.Error, sqlite3.Error, DatabaseInsertError) as e:
-        print(f"Error: {e}")
-        raise WorkflowError(f"Error: {e}") from e
+    Returns:
+        Tuple[int, List[int]]: Index of the Qualys ID column and the indexes of the attribute columns,
+                               in axonius_data column order.
+    """
+    positions = {name: index for index, name in enumerate(cleaned_fieldnames)}
+    id_index = None
+    attribute_indexes = []
+    for csv_field, mapped_key in csv_data_contract.items():
+        if mapped_key == 'AssetID':
+            id_index = positions[csv_field]
+        else:
+            attribute_indexes.append(positions[csv_field])
+    return id_index, attribute_indexes
 
 
-def create_payloads_table(_db_path: Path) -> None:
-    conn = sqlite3.connect(_db_path)
-    cursor = conn.cursor()
-    cursor.execute('''DROP TABLE IF EXISTS qualys_attribute_payloads''')
-    cursor.execute('''CREATE TABLE qualys_attribute_payloads (asset_id TEXT, payload TEXT, payload_custom_attributes TEXT)''')
-    conn.commit()
-    conn.close()
+def explode_csv_rows(rows: Iterator[List[str]], id_index: int, attribute_indexes: List[int],
+                     field_count: int) -> Iterator[Tuple[str, ...]]:
+    """
+    Normalizes parsed CSV rows and explodes multi asset ID cells into one axonius_data row tuple per
+    asset ID.  Shared by the sequential and the parallel CSV readers.
+    """
+    for _row in rows:
+        if len(_row) < field_count:
+            # Short rows behave like DictReader, missing fields are empty
+            _row = _row + [''] * (field_count - len(_row))
+        attributes = tuple(normalize_csv_value(_row[index]) for index in attribute_indexes)
+        for asset_id in normalize_csv_value(_row[id_index]).split(','):
+            asset_id = asset_id.strip()
+            if asset_id:
+                yield (asset_id,) + attributes
+
+
+def iterate_over_csv_rows_returning_row_batches(file_path: Union[str, Path],
+                                                batch_size: int) -> Iterator[List[Tuple[str, ...]]]:
+    """
+    Bulk ingest reader for axonius_data.  Parses the CSV positionally with the column projection
+    computed once from the header, normalizes each value, explodes multi asset ID cells into one row
+    per asset ID and yields lists of at most batch_size row tuples ready for executemany.
 
+    Args:
+        file_path (Union[str, Path]): Path to the input CSV file.
+        batch_size (int): Maximum number of row tuples per yielded batch.
 
-def iterate_over_axonious_rows(conn) -> Iterator[Dict[str, Any]]:
+    Raises:
+        FileNotFoundError: If the CSV file does not exist.
+        ValueError: If the CSV header breaks csv_data_contract.
+        csv.Error: If the CSV file cannot be parsed.
+    """
+    file_path = Path(file_path)
+    if not file_path.exists():
+        raise FileNotFoundError(f"CSV file not found: {file_path}")
     try:
-        # Connect to the database
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        with open_csv_file(file_path) as file:
+            cleaned_fieldnames = read_csv_fieldnames(file)
+            id_index, attribute_indexes = get_axonius_column_projection(cleaned_fieldnames)
+
+            batch = []
+            for row_tuple in explode_csv_rows(csv.reader(file), id_index, attribute_indexes,
+                                              len(cleaned_fieldnames)):
+                batch.append(row_tuple)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+    except csv.Error as e:
+        raise csv.Error(f"Error parsing CSV file: {e}")
+    except (OSError, EOFError, lzma.LZMAError) as e:
+        raise ValueError(f"Error decompressing CSV file {file_path}: {e}")
 
-        # Check if the table exists
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='axonious_data'")
-        if not cursor.fetchone():
-            raise sqlite3.Error("Table 'axonious_data' does not exist in the database")
 
-        # Query all rows and yield one at a time
-        cursor.execute("SELECT * FROM axonious_data")
-        for _row in cursor:
-            yield dict(_row)
+def find_csv_record_boundaries(file_path: Path, start_offset: int, chunk_bytes: int) -> List[Tuple[int, int]]:
+    """
+    Splits the CSV body into record-aligned byte ranges of roughly chunk_bytes each.  A range only
+    ends on a newline that lies outside a quoted field, so quoted multi-line cells such as
+    "Qualys Scans: Qualys ID" are never cut in two.  Quote parity is tracked with bytes.count over
+    large blocks, which is much cheaper than parsing the CSV.  Both '"' and '\\n' are single bytes
+    in UTF-8 and can not occur inside a multibyte character.
 
-    except sqlite3.Error as e:
-        raise sqlite3.Error(f"Database error: {e}")
+    Args:
+        file_path (Path): Path to the CSV file.
+        start_offset (int): Byte offset of the first record (the end of the header line).
+        chunk_bytes (int): Target size of each byte range.
 
+    Returns:
+        List[Tuple[int, int]]: (start, end) byte offsets of each range, in file order.
+    """
+    file_size = file_path.stat().st_size
+    block_size = 1024 * 1024
+    ranges = []
+    with open(file_path, mode='rb') as file:
+        file.seek(start_offset)
+        position = start_offset  # file offset of the next unread byte
+        range_start = start_offset
+        in_quotes = False
+        while range_start < file_size:
+            target = range_start + chunk_bytes
+            if target >= file_size:
+                ranges.append((range_start, file_size))
+                break
+            # Carry quote parity forward to the target offset
+            while position < target:
+                block = file.read(min(block_size, target - position))
+                if not block:
+                    break
+                in_quotes ^= bool(block.count(b'"') & 1)
+                position += len(block)
+            # Find the first newline at or after the target that is outside quotes
+            range_end = file_size
+            while position < file_size:
+                block = file.read(block_size)
+                if not block:
+                    break
+                index = 0
+                newline = block.find(b'\n', index)
+                while newline != -1:
+                    in_quotes ^= bool(block.count(b'"', index, newline) & 1)
+                    index = newline + 1
+                    if not in_quotes:
+                        break
+                    newline = block.find(b'\n', index)
+                if newline != -1:
+                    range_end = position + index
+                    # Rewind to just after the boundary so parity restarts at a record start
+                    file.seek(range_end)
+                    position = range_end
+                    break
+                in_quotes ^= bool(block.count(b'"', index) & 1)
+                position += len(block)
+            ranges.append((range_start, range_end))
+            range_start = range_end
+    return ranges
+
+
+def parse_csv_byte_range(task: Tuple[str, int, int, int, List[int], int]) -> List[Tuple[str, ...]]:
+    """
+    Process pool worker for iterate_over_csv_rows_parallel.  Parses one record-aligned byte range of
+    the CSV file and returns its axonius_data row tuples.
+    """
+    file_path, start, end, id_index, attribute_indexes, field_count = task
+    with open(file_path, mode='rb') as file:
+        file.seek(start)
+        text = file.read(end - start).decode('utf-8')
+    try:
+        reader = csv.reader(io.StringIO(text, newline=''))
+        return list(explode_csv_rows(reader, id_index, attribute_indexes, field_count))
+    except csv.Error as e:
+        raise csv.Error(f"Error parsing CSV file bytes {start}-{end}: {e}")
 
-def print_axonious_data(_db_path: Path) -> None:
-    for row_idx, row in enumerate(iterate_over_axonious_rows(_db_path), 1):
-        print(f"\nRow {row_idx}:")
-        for key, value in row.items():
-            print(f"  {key}: {value}")
 
+def iterate_over_csv_rows_parallel(file_path: Union[str, Path], workers: int,
+                                   chunk_bytes: int = None) -> Iterator[List[Tuple[str, ...]]]:
+    """
+    Parallel bulk ingest reader for axonius_data.  Validates the header, splits the CSV body into
+    record-aligned byte ranges and parses the ranges in a process pool.  Yields the row tuples of each
+    range in file order, so the resulting table matches the sequential reader row for row.  At most
+    two ranges per worker are in flight to bound memory.
 
-def insert_qualys_payload(cursor, asset_id, payload, payload_custom_attributes):
-    try:
-        cursor.execute('''
-            INSERT INTO qualys_attribute_payloads (asset_id, payload, payload_custom_attributes)
-            VALUES (?, ?, ?)
-        ''', (asset_id, payload, payload_custom_attributes))
-    except Exception as e:
-        print(f"Error inserting row: {e}")
-        error_msg = f"Failed to insert asset_id={asset_id}: {e}"
+    Args:
+        file_path (Union[str, Path]): Path to the input CSV file.
+        workers (int): Number of parser processes.
+        chunk_bytes (int): Target byte range size (default: q_csv_chunk_bytes).
+
+    Raises:
+        FileNotFoundError: If the CSV file does not exist.
+        ValueError: If the CSV header breaks csv_data_contract.
+        csv.Error: If the CSV file cannot be parsed.
+    """
+    file_path = Path(file_path)
+    if not file_path.exists():
+        raise FileNotFoundError(f"CSV file not found: {file_path}")
+    if chunk_bytes is None:
+        chunk_bytes = q_csv_chunk_bytes
+
+    with open(file_path, mode='rb') as file:
+        header_line = file.readline()
+    cleaned_fieldnames = read_csv_fieldnames(io.StringIO(header_line.decode('utf-8'), newline=''))
+    id_index, attribute_indexes = get_axonius_column_projection(cleaned_fieldnames)
+    field_count = len(cleaned_fieldnames)
+
+    ranges = find_csv_record_boundaries(file_path, len(header_line), chunk_bytes)
+    print(f"Parsing {file_path} in {len(ranges)} byte ranges with {workers} worker processes")
+    tasks = iter([(str(file_path), start, end, id_index, attribute_indexes, field_count)
+                  for start, end in ranges])
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(parse_csv_byte_range, task))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def iterate_over_csv_row_batches(_csv_data_file, _batch_size: int,
+                                 _parse_workers: int = 1) -> Iterator[List[Tuple[str, ...]]]:
+    """
+    Yields batches of axonius_data row tuples from the CSV file, parsed by _parse_workers processes when
+    the file is not compressed, else by the sequential reader.
+    """
+    compression = detect_csv_compression(_csv_data_file)
+    if compression:
+        print(f"Reading {compression} compressed CSV file {_csv_data_file} as a stream")
+    if _parse_workers > 1 and compression:
+        # Byte ranges can not be addressed inside a compressed stream
+        print(f"Parallel parsing is not available for {compression} input, parsing with 1 process")
+    if _parse_workers > 1 and not compression:
+        return iterate_over_csv_rows_parallel(_csv_data_file, _parse_workers)
+    return iterate_over_csv_rows_returning_row_batches(_csv_data_file, _batch_size)
+
+
+def database_exists(_db_path: Path, _database: Optional[QualysRunDatabase] = None) -> bool:
+    """Returns whether the run database exists; a run database passed as _database is open for the whole run."""
+    return _database is not None or Path(_db_path).exists()
+
+
+@contextmanager
+def connect_database(_db_path: Path, _database: Optional[QualysRunDatabase] = None) -> Iterator[sqlite3.Connection]:
+    """
+    Yields the connection of the run database _database in a transaction of the stage.  A stage called on
+    its own, without _database, opens _db_path with the pragmas of the storage profile of the run.  Like
+    a sqlite3 connection used in a with statement it commits on success and rolls back on error, then it
+    also closes the connection, so a WAL database is checkpointed.
+    """
+    if _database is not None:
+        with _database.transaction() as conn:
+            yield conn
+        return
+    conn = sqlite3.connect(_db_path, check_same_thread=False)
+    try:
+        for pragma, value in q_storage_profiles[q_run_options['storage_profile']].items():
+            conn.execute(f"PRAGMA {pragma}={value}")
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def record_storage_profile(_db_path: Path, _database: Optional[QualysRunDatabase] = None) -> None:
+    """
+    Records the storage profile of the run in the storage_settings table, with the value of each pragma as
+    requested and as SQLite reports it back on the connection of the stage.  journal_mode is kept in the
+    database file; a file system without shared memory support falls back from WAL, which shows here.
+    """
+    profile = q_run_options['storage_profile']
+    try:
+        with connect_database(_db_path, _database) as conn:
+            cursor = conn.cursor()
+            cursor.execute("CREATE TABLE IF NOT EXISTS storage_settings (setting TEXT PRIMARY KEY, "
+                           "requested TEXT, applied TEXT)")
+            settings = [('storage_profile', profile, profile)]
+            for pragma, value in q_storage_profiles[profile].items():
+                # An in-memory database reports no mmap_size, recorded as NULL
+                applied = cursor.execute(f"PRAGMA {pragma}").fetchone()
+                settings.append((pragma, str(value), None if applied is None else str(applied[0])))
+            cursor.executemany("INSERT OR REPLACE INTO storage_settings (setting, requested, applied) "
+                               "VALUES (?, ?, ?)", settings)
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        raise
+    print(f"Storage profile {profile}: " + ", ".join(f"{setting}={applied}" for setting, _, applied in settings[1:]))
+    q_run_summary['Storage profile'] = profile
+
+
+def has_run_history(_database: QualysRunDatabase) -> bool:
+    """Returns whether the run database is a persistent database with the runs table."""
+    return _database.conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='runs'").fetchone() \
+        is not None
+
+
+def resume_has_run_history(_db_path: Path) -> bool:
+    """
+    Returns whether the database file to resume is a persistent database with the runs table.  The file is
+    opened read-only, so the check runs before the storage profile of the run is applied to it; a file that
+    cannot be read is left to the resume itself to report.
+    """
+    try:
+        with closing(sqlite3.connect(f"file:{_db_path}?mode=ro", uri=True)) as conn:
+            return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='runs'").fetchone() \
+                is not None
+    except sqlite3.Error:
+        return False
+
+
+def begin_history_run(_database: QualysRunDatabase, _csv_data_file: Path, _q_api_function: str,
+                      _dry_run: bool) -> int:
+    """
+    Starts a run in a persistent database and returns its run_id.  The history tables runs,
+    run_execution_log and run_duplicates are created on first use.  The run database sets incremental
+    auto_vacuum on a new file; a file that is not in incremental auto_vacuum yet is converted once with
+    VACUUM.  The stage tables of the previous run are dropped, so the stage tables always belong to the
+    latest run.  A --resume continues the latest run and keeps its stage tables.
+
+    Args:
+        _database (QualysRunDatabase): Run database of the run.
+        _csv_data_file (Path): Input CSV file of the run.
+        _q_api_function (str): Function add, update, remove.
+        _dry_run (bool): Dry run flag of the run.
+
+    Returns:
+        int: The run_id of the run.
+    """
+    history_tables = ('runs', 'run_execution_log', 'run_duplicates', 'qualys_attribute_payloads_applied')
+    conn = _database.conn
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        # Once the file header is written, auto_vacuum only changes with the next VACUUM
+        print(f"Converting {_database.db_path} to incremental auto_vacuum with VACUUM...")
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    with _database.transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id        INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at    TEXT,
+                ended_at      TEXT,
+                status        TEXT,
+                seconds       REAL,
+                csv_file      TEXT,
+                api_function  TEXT,
+                dry_run       INTEGER,
+                options       TEXT,
+                stage_seconds TEXT,
+                summary       TEXT,
+                resumed       INTEGER
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS run_execution_log (
+                run_id                    INTEGER,
+                asset_ids                 TEXT,
+                payload_custom_attributes TEXT,
+                count_asset_ids           INTEGER,
+                group_number              INTEGER,
+                batch_number              INTEGER,
+                status                    TEXT,
+                execution_log             TEXT,
+                attempts                  INTEGER,
+                outcome                   TEXT,
+                sub_batch                 TEXT,
+                parent_sub_batch          TEXT
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_run_execution_log_run_id "
+                       "ON run_execution_log (run_id, group_number, batch_number)")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS run_duplicates (
+                run_id                    INTEGER,
+                asset_id                  TEXT,
+                payload_custom_attributes TEXT,
+                asset_key                 TEXT,
+                attr_hash                 TEXT,
+                duplicate_count           INTEGER
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_run_duplicates_run_id ON run_duplicates (run_id)")
+
+        # The applied state is kept across runs and never pruned, a history from before it is replayed once
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='qualys_attribute_payloads_applied'")
+        if not cursor.fetchone():
+            create_applied_table(cursor)
+            conn.create_function("merge_attributes", 2, merge_custom_attributes, deterministic=True)
+            cursor.execute("SELECT DISTINCT api_function FROM runs")
+            for (api_function,) in cursor.fetchall():
+                cursor.execute("CREATE TEMP TABLE history_applied (asset_id TEXT PRIMARY KEY, "
+                               "payload_custom_attributes TEXT, run_id INTEGER)")
+                read_cursor = conn.cursor()
+                read_cursor.execute("""
+                    SELECT l.asset_ids, l.payload_custom_attributes, l.run_id
+                    FROM run_execution_log l
+                    JOIN runs r ON r.run_id = l.run_id
+                    WHERE CAST(l.status AS TEXT) = '200' AND l.outcome = 'success' AND r.api_function = ?
+                    ORDER BY l.run_id, l.group_number, l.batch_number
+                """, (api_function,))
+                upsert_applied_assets(cursor, "temp.history_applied", read_cursor)
+                cursor.execute("""
+                    INSERT INTO qualys_attribute_payloads_applied (api_function, asset_id, payload_custom_attributes)
+                    SELECT ?, asset_id, payload_custom_attributes FROM temp.history_applied
+                """, (api_function,))
+                cursor.execute("DROP TABLE temp.history_applied")
+
+        if q_run_options['resume_db'] is not None:
+            run_id = cursor.execute("SELECT MAX(run_id) FROM runs").fetchone()[0]
+            if run_id is not None:
+                cursor.execute("UPDATE runs SET status = 'running', resumed = resumed + 1 WHERE run_id = ?",
+                               (run_id,))
+                print(f"Resuming run {run_id} of persistent database {_database.db_path}")
+                q_run_summary['Persistent run'] = f"{run_id} (resumed) in {_database.db_path}"
+                return run_id
+
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        for (table_name,) in cursor.fetchall():
+            if table_name not in history_tables and not table_name.startswith('sqlite_'):
+                cursor.execute(f"DROP TABLE {table_name}")
+        cursor.execute("""
+            INSERT INTO runs (started_at, status, csv_file, api_function, dry_run, options, resumed)
+            VALUES (?, 'running', ?, ?, ?, ?, 0)
+        """, (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), str(_csv_data_file), _q_api_function, int(_dry_run),
+              json.dumps(q_run_options, default=str, sort_keys=True)))
+        run_id = cursor.lastrowid
+    print(f"Started run {run_id} in persistent database {_database.db_path}")
+    q_run_summary['Persistent run'] = f"{run_id} in {_database.db_path}"
+    return run_id
+
+
+def prune_run_history(cursor, run_id: int, retention_days: Optional[int], retention_runs: Optional[int]) -> int:
+    """
+    Deletes the runs outside the retention policy, started more than retention_days ago or older than
+    the last retention_runs runs, with their history rows.  qualys_attribute_payloads_applied keeps the
+    latest applied state of every asset, so the --baseline-db of the next run does not depend on them.
+    0 or None disables a limit, the run run_id is always kept.  Returns the number of runs deleted.
+    """
+    conditions, params = [], []
+    if retention_days:
+        conditions.append("started_at < ?")
+        params.append((datetime.now() - timedelta(days=retention_days)).strftime('%Y-%m-%d %H:%M:%S'))
+    if retention_runs:
+        conditions.append("run_id NOT IN (SELECT run_id FROM runs ORDER BY run_id DESC LIMIT ?)")
+        params.append(retention_runs)
+    if not conditions:
+        return 0
+    pruned_runs = f"SELECT run_id FROM runs WHERE run_id != ? AND ({' OR '.join(conditions)})"
+    # History rows are deleted by their run_id index before the runs rows they are selected by
+    for table_name in ('run_execution_log', 'run_duplicates', 'runs'):
+        cursor.execute(f"DELETE FROM {table_name} WHERE run_id IN ({pruned_runs})", [run_id] + params)
+    return cursor.rowcount
+
+
+def finish_history_run(_database: QualysRunDatabase, run_id: int, status: str, seconds: float,
+                       stage_seconds: Dict[str, float]) -> None:
+    """
+    Archives the execution log and duplicates of the run into run_execution_log and run_duplicates,
+    replacing what an earlier attempt of a resumed run archived, and records its status, timings and
+    run summary in runs.  Then prunes the runs outside the retention policy, returns up to
+    q_history_vacuum_pages free pages to the file system with incremental_vacuum and updates the query
+    planner statistics with PRAGMA optimize.
+
+    Args:
+        _database (QualysRunDatabase): Run database of the run.
+        run_id (int): The run_id from begin_history_run.
+        status (str): 'success' or 'failed'.
+        seconds (float): Wall time of the run in seconds.
+        stage_seconds (Dict[str, float]): Seconds per workflow stage.
+    """
+    try:
+        with _database.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+            tables = {row[0] for row in cursor.fetchall()}
+            cursor.execute("DELETE FROM run_execution_log WHERE run_id = ?", (run_id,))
+            cursor.execute("DELETE FROM run_duplicates WHERE run_id = ?", (run_id,))
+            archived_rows = 0
+            if "qualys_attribute_payloads_transformed_execution_log" in tables:
+                cursor.execute("""
+                    INSERT INTO run_execution_log (run_id, asset_ids, payload_custom_attributes, count_asset_ids,
+                                                   group_number, batch_number, status, execution_log, attempts,
+                                                   outcome, sub_batch, parent_sub_batch)
+                    SELECT ?, asset_ids, payload_custom_attributes, count_asset_ids, group_number, batch_number,
+                           status, execution_log, attempts, outcome, sub_batch, parent_sub_batch
+                    FROM qualys_attribute_payloads_transformed_execution_log
+                    ORDER BY rowid
+                """, (run_id,))
+                archived_rows = cursor.rowcount
+            if "qualys_attribute_payloads_duplicates" in tables:
+                cursor.execute("""
+                    INSERT INTO run_duplicates (run_id, asset_id, payload_custom_attributes, asset_key, attr_hash,
+                                                duplicate_count)
+                    SELECT ?, asset_id, payload_custom_attributes, asset_key, attr_hash, duplicate_count
+                    FROM qualys_attribute_payloads_duplicates
+                """, (run_id,))
+
+            # A resumed run adds the seconds and stage timings of each attempt
+            previous_seconds, previous_stage_seconds = cursor.execute(
+                "SELECT seconds, stage_seconds FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            run_stage_seconds = json.loads(previous_stage_seconds or '{}')
+            for stage, stage_elapsed in stage_seconds.items():
+                run_stage_seconds[stage] = round(run_stage_seconds.get(stage, 0) + stage_elapsed, 3)
+            pruned_runs = prune_run_history(cursor, run_id, q_run_options['retention_days'],
+                                            q_run_options['retention_runs'])
+            q_run_summary['Run history'] = (f"run {run_id} archived with {archived_rows} execution log rows, "
+                                            f"{pruned_runs} old runs pruned")
+            cursor.execute("""
+                UPDATE runs SET ended_at = ?, status = ?, seconds = ?, stage_seconds = ?, summary = ?
+                WHERE run_id = ?
+            """, (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), status, round((previous_seconds or 0) + seconds, 3),
+                  json.dumps(run_stage_seconds), json.dumps(q_run_summary), run_id))
+
+        freelist_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        # incremental_vacuum frees one page per step, executescript steps it to completion
+        conn.executescript(f"PRAGMA incremental_vacuum({q_history_vacuum_pages})")
+        conn.execute("PRAGMA optimize")
+        print(f"Archived run {run_id} ({status}) with {archived_rows} execution log rows, pruned {pruned_runs} "
+              f"old runs, vacuumed {freelist_pages - conn.execute('PRAGMA freelist_count').fetchone()[0]} "
+              f"of {freelist_pages} free pages")
+    except sqlite3.Error as e:
+        print(f"Database error archiving run {run_id}: {e}")
+        raise WorkflowError(f"Error archiving run {run_id}: {e}") from e
+
+
+def create_axonius_table(_csv_data_file, _batch_size: int = None, _parse_workers: int = 1,
+                         _database: Optional[QualysRunDatabase] = None):
+    if _batch_size is None:
+        _batch_size = q_insert_batch_size
+    try:
+        # Open the SQLite database
+        with connect_database(q_database_file, _database) as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(f'''DROP TABLE IF EXISTS {axonious_table_name}''')
+            # Create the table if it doesn't exist (using simplified column names)
+            cursor.execute(f'''CREATE TABLE IF NOT EXISTS {axonious_table_name} 
+                              (
+                                  qualys_id
+                                  TEXT,
+                                  Business
+                                  TEXT,
+                                  Division
+                                  TEXT,
+                                  Product_Group
+                                  TEXT,
+                                  Portfolio
+                                  TEXT,
+                                  Product
+                                  TEXT,
+                                  Primary_Service
+                                  TEXT,
+                                  Service_Owner_Group
+                                  TEXT,
+                                  Device_Owner_Group
+                                  TEXT,
+                                  Recovery_Tier
+                                  TEXT,
+                                  SLA
+                                  TEXT
+                              )''')
+
+            # Stream CSV rows into executemany batches of _batch_size rows
+            start_time = time.perf_counter()
+            rows_inserted = 0
+            for rows in iterate_over_csv_row_batches(_csv_data_file, _batch_size, _parse_workers):
+                for offset in range(0, len(rows), _batch_size):
+                    batch = rows[offset:offset + _batch_size]
+                    cursor.executemany(
+                        f'''INSERT INTO {axonious_table_name} (qualys_id,
+                                             Business, Division, Product_Group, Portfolio,
+                                             Product, Primary_Service, Service_Owner_Group, Device_Owner_Group,
+                                             Recovery_Tier, SLA)
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', batch)
+                    rows_inserted += len(batch)
+
+            # Commit all inserts after processing all rows
+            conn.commit()
+            elapsed = time.perf_counter() - start_time
+            rows_per_sec = rows_inserted / elapsed if elapsed > 0 else 0
+            print(f"Data successfully inserted into the database. "
+                  f"Inserted {rows_inserted:,} rows into {axonious_table_name} in {elapsed:.2f} seconds "
+                  f"({rows_per_sec:,.0f} rows/sec, batch size {_batch_size:,}, parse workers {_parse_workers}).")
+
+    except (FileNotFoundError, ValueError, csv.Error, sqlite3.Error, DatabaseInsertError) as e:
+        print(f"Error: {e}")
+        raise WorkflowError(f"Error: {e}") from e
+
+
+def create_payloads_table(_db_path: Path, asset_id_type: str = 'text',
+                          _database: Optional[QualysRunDatabase] = None) -> None:
+    with connect_database(_db_path, _database) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''DROP TABLE IF EXISTS qualys_attribute_payloads''')
+        cursor.execute(f'''CREATE TABLE qualys_attribute_payloads (asset_id {asset_id_type.upper()}, payload TEXT,
+                           payload_custom_attributes TEXT, asset_key TEXT, attr_hash TEXT)''')
+        conn.commit()
+
+
+def iterate_over_axonious_rows(conn) -> Iterator[Dict[str, Any]]:
+    try:
+        # Rows as sqlite3.Row on this cursor only, the connection is shared with the other stages
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+
+        # Check if the table exists
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='axonious_data'")
+        if not cursor.fetchone():
+            raise sqlite3.Error("Table 'axonious_data' does not exist in the database")
+
+        # Query all rows and yield one at a time
+        cursor.execute("SELECT * FROM axonious_data")
+        for _row in cursor:
+            yield dict(_row)
+
+    except sqlite3.Error as e:
+        raise sqlite3.Error(f"Database error: {e}")
+
+
+def print_axonious_data(_db_path: Path) -> None:
+    for row_idx, row in enumerate(iterate_over_axonious_rows(_db_path), 1):
+        print(f"\nRow {row_idx}:")
+        for key, value in row.items():
+            print(f"  {key}: {value}")
+
+
+def insert_qualys_payload(cursor, asset_id, payload, payload_custom_attributes):
+    try:
+        cursor.execute('''
+            INSERT INTO qualys_attribute_payloads (asset_id, payload, payload_custom_attributes, asset_key, attr_hash)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (asset_id, payload, payload_custom_attributes, get_asset_key(asset_id),
+              q_payload_builder.attributes_hash(payload_custom_attributes)))
+    except Exception as e:
+        print(f"Error inserting row: {e}")
+        error_msg = f"Failed to insert asset_id={asset_id}: {e}"
         raise DatabaseInsertError(error_msg) from e
 
 
 
 def create_payload(asset_ids: str, _custom_attributes: list) -> tuple[str, str]:
-    payload_template_dict = json.loads(payload_template_str)
-    criteria = payload_template_dict['ServiceRequest']['filters']['Criteria']
-    criteria[0]['value'] = re.sub(r'\n+', ',', asset_ids.strip())
-
-    payload_custom_attributes \
-        = payload_template_dict['ServiceRequest']['data']['Asset']['customAttributes']['add']['CustomAttribute']
-    payload_custom_attributes = []
-    for i, attr in enumerate(_custom_attributes):
-        if attr['key'] != 'qualys_id':
-            if attr['value'] != '':
-                payload_custom_attributes.append({'key': attr['key'], 'value': attr['value']})
-            # payload_template_dict['ServiceRequest']['data']['Asset']['customAttributes']['add']['CustomAttribute'][i]['key'] = _custom_attributes[i]['key']
-            # payload_template_dict['ServiceRequest']['data']['Asset']['customAttributes']['add']['CustomAttribute'][i]['value'] = _custom_attributes[i]['value']
-    payload_str = json.dumps(payload_template_dict)
-    payload_custom_attributes_str = json.dumps(payload_custom_attributes)
+    # The template and each distinct attribute set are serialized once by q_payload_builder
+    payload_str = q_payload_builder.asset_payload(re.sub(r'\n+', ',', asset_ids.strip()))
+    payload_custom_attributes_str = q_payload_builder.custom_attributes(_custom_attributes)
     return payload_str, payload_custom_attributes_str
 
 
-def populate_payloads_table(_db_path: Path):
+def populate_payloads_table(_db_path: Path, _database: Optional[QualysRunDatabase] = None):
     count = 0
-    with sqlite3.connect(_db_path) as conn:
+    with connect_database(_db_path, _database) as conn:
         cursor = conn.cursor()
         for _row_idx, _row in enumerate(iterate_over_axonious_rows(conn), 1):
             row_data = []
@@ -698,27 +2170,51 @@ def populate_payloads_table(_db_path: Path):
         if count % 1000 != 0:
             print(f"Processed {count} rows, committing remaining changes")
             conn.commit()
+        # Indexed once after the bulk insert for the duplicates and clean stages
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_qualys_attribute_payloads_asset_key "
+                       "ON qualys_attribute_payloads (asset_key)")
+        conn.commit()
 
 
 def create_group_payloads_by_asset_table(_db_path: Path,
-                                         new_table_name: str = "qualys_attribute_payloads_grouped") -> None:
+                                         new_table_name: str = "qualys_attribute_payloads_grouped",
+                                         source_table: str = "qualys_attribute_payloads_clean",
+                                         key_only: bool = False,
+                                         asset_id_type: str = 'text',
+                                         members_table: str = "qualys_attribute_payloads_group_members",
+                                         _database: Optional[QualysRunDatabase] = None) -> None:
     """Group Qualys payloads into asset ID lists by unique key-data pairs and add group numbers.
 
+    With key_only, used for the remove function, payloads are grouped by their set of keys alone and
+    payload_custom_attributes holds only the keys, so assets that differ only in values share batches.
+
+    With asset_id_type 'integer' the asset IDs of a group are not concatenated: asset_ids is left NULL
+    and members_table holds one (group_number, asset_id) row per asset, with asset_id as INTEGER.  The
+    table is WITHOUT ROWID with both columns as primary key, so it is its own covering index for
+    create_split_payloads_table.
+
     Args:
         _db_path (Path): Path to the SQLite database file.
         new_table_name (str): Name of the table to create (default: 'qualys_attribute_payloads_grouped').
+        source_table (str): Name of the source table (default: 'qualys_attribute_payloads_clean').
+        key_only (bool): Group by custom attribute keys only (default: False).
+        asset_id_type (str): 'text' or 'integer' (default: 'text').
+        members_table (str): Name of the group membership table for 'integer'.
+        _database (QualysRunDatabase): Run database shared by the stages of the run (optional).
 
     Raises:
         FileNotFoundError: If the database file does not exist.
         sqlite3.Error: If a database error occurs.
         Exception: For other unexpected errors.
     """
-    if not _db_path.exists():
+    if not database_exists(_db_path, _database):
         raise WorkflowError(f"Database file not found: {_db_path}")
 
     try:
-        print(f"Creating '{new_table_name}' from qualys_attribute_payloads table...")
-        with sqlite3.connect(_db_path) as conn:
+        print(f"Creating '{new_table_name}' from {source_table} table...")
+        with connect_database(_db_path, _database) as conn:
+            conn.create_function("attr_keys", 1, get_custom_attribute_keys, deterministic=True)
+            conn.create_function("attr_hash", 1, hash_custom_attributes, deterministic=True)
             cursor = conn.cursor()
 
             cursor.execute(f"DROP TABLE IF EXISTS {new_table_name}")
@@ -736,110 +2232,821 @@ def create_group_payloads_by_asset_table(_db_path: Path,
             # Clear the table if it already exists
             cursor.execute(f"DELETE FROM {new_table_name}")
 
-            # Insert grouped data (excluding group_number for now)
+            # Insert grouped data (excluding group_number for now), remove groups by keys only.  Other
+            # functions group on the indexed attr_hash, groups are numbered in attribute text order.
+            if key_only:
+                group_by = "attr_keys(payload_custom_attributes)"
+                group_attributes = group_by
+            else:
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{source_table}_attr_hash ON {source_table} (attr_hash)")
+                group_by = "attr_hash"
+                group_attributes = "REPLACE(MAX(payload_custom_attributes), char(65279), '')"
+            asset_ids = "NULL" if asset_id_type == 'integer' \
+                else "GROUP_CONCAT(REPLACE(COALESCE(asset_id, ''), char(65279), ''), ',')"
             cursor.execute("""
                 INSERT INTO {new_table_name} (asset_ids, payload, payload_custom_attributes, count_asset_ids)
                 SELECT 
-                    GROUP_CONCAT(REPLACE(COALESCE(asset_id, ''), char(65279), ''), ',') AS asset_ids,
+                    {asset_ids} AS asset_ids,
                     MAX(payload) AS payload,
-                    REPLACE(payload_custom_attributes, char(65279), '') AS payload_custom_attributes,
+                    {group_attributes} AS payload_custom_attributes,
                     COUNT(asset_id) AS count_asset_ids
-                FROM qualys_attribute_payloads_clean
-                GROUP BY REPLACE(payload_custom_attributes, char(65279), '')
-            """.format(new_table_name=new_table_name))
+                FROM {source_table}
+                GROUP BY {group_by}
+                ORDER BY payload_custom_attributes
+            """.format(new_table_name=new_table_name, source_table=source_table, group_by=group_by,
+                       group_attributes=group_attributes, asset_ids=asset_ids))
+
+            # Add group numbers as integers starting from 1
+            cursor.execute(f"""
+                UPDATE {new_table_name}
+                SET group_number = (
+                    SELECT rowid
+                    FROM {new_table_name} AS t
+                    WHERE t.rowid = {new_table_name}.rowid
+                )
+            """)
+            group_count = cursor.rowcount
+
+            # Integer asset IDs: one membership row per asset, joined to its group on the grouping key
+            if asset_id_type == 'integer':
+                if key_only:
+                    group_key, member_key = "payload_custom_attributes", "attr_keys(s.payload_custom_attributes)"
+                else:
+                    group_key, member_key = "attr_hash(payload_custom_attributes)", "s.attr_hash"
+                cursor.execute("DROP TABLE IF EXISTS temp.group_keys")
+                cursor.execute(f"""
+                    CREATE TEMP TABLE group_keys AS
+                    SELECT {group_key} AS group_key, group_number FROM {new_table_name}
+                """)
+                cursor.execute("CREATE UNIQUE INDEX temp.idx_group_keys ON group_keys (group_key)")
+                cursor.execute(f"DROP TABLE IF EXISTS {members_table}")
+                cursor.execute(f"""
+                    CREATE TABLE {members_table} (
+                        group_number INTEGER,
+                        asset_id     INTEGER,
+                        PRIMARY KEY (group_number, asset_id)
+                    ) WITHOUT ROWID
+                """)
+                # Inserted in key order, an asset ID is a member of a group once
+                cursor.execute(f"""
+                    INSERT OR IGNORE INTO {members_table} (group_number, asset_id)
+                    SELECT k.group_number, TRIM(REPLACE(s.asset_id, char(65279), ''))
+                    FROM {source_table} s
+                    JOIN temp.group_keys k ON k.group_key = {member_key}
+                    WHERE TRIM(REPLACE(COALESCE(s.asset_id, ''), char(65279), '')) != ''
+                    ORDER BY 1, 2
+                """)
+                member_count = cursor.rowcount
+                cursor.execute("DROP TABLE temp.group_keys")
+                print(f"Created '{members_table}' with {member_count} asset IDs.")
+
+            # Commit the changes
+            conn.commit()
+            print(f"Created or replaced table '{new_table_name}' with {group_count} rows.")
+
+    except sqlite3.Error as e:
+        error_msg = f"SQLite error in '{new_table_name}' creation: {e}"
+        raise WorkflowError(error_msg) from e
+    except Exception as e:
+        error_msg = f"Unexpected error creating grouped table '{new_table_name}': {e}"
+        raise WorkflowError(error_msg) from e
+
+
+def create_deduplicated_payload_tables(
+        _db_path: Path,
+        source_table: str = "qualys_attribute_payloads",
+        new_table: str = "qualys_attribute_payloads_clean",
+        dup_table: str = "qualys_attribute_payloads_duplicates",
+        asset_id_type: str = 'text',
+        _database: Optional[QualysRunDatabase] = None
+) -> int:
+    """
+    Splits source_table into new_table, the rows whose asset_key appears once, and dup_table, a compact
+    report of the rows whose asset_key appears more than once.  Every row of a duplicated asset ID is
+    left out of new_table.  Drops both tables if they already exist.
+
+    The duplicated rows are found with COUNT(*) OVER (PARTITION BY asset_key) over the asset_key index
+    alone, then source_table is scanned once, in rowid order, to write new_table.  The report keeps the
+    asset ID, its custom attributes and the number of rows of its asset_key, not the payload.
+
+    Args:
+        _db_path (Path): Path to SQLite database
+        source_table (str): Source table with indexed asset_key and attr_hash columns
+        new_table (str): Output clean table
+        dup_table (str): Output duplicate report
+        asset_id_type (str): Column type of asset_id in new_table, 'text' or 'integer' (default: 'text')
+        _database (QualysRunDatabase): Run database shared by the stages of the run (optional).
+
+    Returns:
+        int: Number of rows inserted into new_table
+
+    Raises:
+        WorkflowError: If the database file does not exist or a database error occurs.
+    """
+    _db_path = Path(_db_path)
+    if not database_exists(_db_path, _database):
+        raise WorkflowError(f"Database file not found: {_db_path}")
+
+    try:
+        with connect_database(_db_path, _database) as conn:
+            cursor = conn.cursor()
+
+            # Rows of duplicated asset IDs, from a scan of the covering asset_key index
+            cursor.execute("DROP TABLE IF EXISTS temp.duplicate_rows")
+            cursor.execute("CREATE TEMP TABLE duplicate_rows (source_rowid INTEGER PRIMARY KEY, "
+                           "duplicate_count INTEGER)")
+            cursor.execute(f"""
+                INSERT INTO temp.duplicate_rows (source_rowid, duplicate_count)
+                SELECT source_rowid, duplicate_count
+                FROM (
+                    SELECT rowid AS source_rowid, COUNT(*) OVER (PARTITION BY asset_key) AS duplicate_count
+                    FROM {source_table}
+                )
+                WHERE duplicate_count > 1
+            """)
+
+            cursor.execute(f"DROP TABLE IF EXISTS {dup_table}")
+            cursor.execute(f"""
+                CREATE TABLE {dup_table} (
+                    asset_id                  TEXT,
+                    payload_custom_attributes TEXT,
+                    asset_key                 TEXT,
+                    attr_hash                 TEXT,
+                    duplicate_count           INTEGER
+                )
+            """)
+            cursor.execute(f"""
+                INSERT INTO {dup_table} (asset_id, payload_custom_attributes, asset_key, attr_hash, duplicate_count)
+                SELECT s.asset_id, s.payload_custom_attributes, s.asset_key, s.attr_hash, d.duplicate_count
+                FROM temp.duplicate_rows d
+                JOIN {source_table} s ON s.rowid = d.source_rowid
+                ORDER BY d.source_rowid
+            """)
+            duplicate_rows = cursor.rowcount
+
+            cursor.execute(f"DROP TABLE IF EXISTS {new_table}")
+            cursor.execute(f"""
+                CREATE TABLE {new_table} (
+                    asset_id                  {asset_id_type.upper()},
+                    payload                   TEXT,
+                    payload_custom_attributes TEXT,
+                    asset_key                 TEXT,
+                    attr_hash                 TEXT
+                )
+            """)
+            cursor.execute(f"""
+                INSERT INTO {new_table} (asset_id, payload, payload_custom_attributes, asset_key, attr_hash)
+                SELECT asset_id, payload, payload_custom_attributes, asset_key, attr_hash
+                FROM {source_table}
+                WHERE rowid NOT IN (SELECT source_rowid FROM temp.duplicate_rows)
+            """)
+            rows_inserted = cursor.rowcount
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{new_table}_attr_hash ON {new_table} (attr_hash)")
+            cursor.execute("DROP TABLE temp.duplicate_rows")
+            conn.commit()
+
+            print(f"Created '{dup_table}' with {duplicate_rows} duplicate rows.")
+            print(f"Success: Inserted {rows_inserted} non-duplicate rows into {new_table}")
+            return rows_inserted
+
+    except sqlite3.Error as e:
+        error_msg = f"SQLite error in '{new_table}' creation: {e}"
+        raise WorkflowError(error_msg) from e
+
+
+def hash_custom_attributes(payload_custom_attributes: Optional[str]) -> str:
+    """
+    Returns a SHA-1 hex digest of a payload_custom_attributes JSON string with BOM characters removed.
+    The attributes are sorted by key first, so the same attributes hash alike in any order.
+    """
+    cleaned = (payload_custom_attributes or '').replace('\ufeff', '')
+    try:
+        cleaned = json.dumps(sorted((attribute['key'], attribute.get('value')) for attribute in json.loads(cleaned)))
+    except (ValueError, TypeError, KeyError):
+        pass
+    return hashlib.sha1(cleaned.encode('utf-8')).hexdigest()
+
+
+def get_asset_key(asset_id: Optional[str]) -> str:
+    """
+    Returns the asset_key of an asset ID, the ID with BOM characters and surrounding whitespace removed and
+    upper cased, which the duplicates and clean stages match on.
+    """
+    return (asset_id or '').replace('\ufeff', '').strip().upper()
+
+
+def merge_custom_attributes(payload_custom_attributes: Optional[str], other_custom_attributes: Optional[str]) -> str:
+    """
+    Merges two payload_custom_attributes JSON strings of the same asset, the keys of the second win.  Used
+    to rebuild the attributes of an asset that a grouping plan sent in several calls.
+    """
+    merged = {}
+    for attributes in (payload_custom_attributes, other_custom_attributes):
+        for attribute in json.loads((attributes or '[]').replace('\ufeff', '')):
+            merged[attribute['key']] = attribute['value']
+    return json.dumps([{'key': key, 'value': value} for key, value in merged.items()])
+
+
+def get_custom_attribute_keys(payload_custom_attributes: Optional[str]) -> str:
+    """
+    Returns a payload_custom_attributes JSON string reduced to its keys, [{"key": ...}, ...] in the same
+    order.  The remove function only needs the keys, so assets that differ in values share a key set.
+    """
+    attributes = json.loads((payload_custom_attributes or '[]').replace('\ufeff', ''))
+    return json.dumps([{'key': attribute['key']} for attribute in attributes])
+
+
+def count_predicted_api_calls(cursor, table_name: str, max_asset_ids: int, key_only: bool = False) -> int:
+    """
+    Returns the number of API calls the group and split stages will produce for the rows of table_name.
+    With key_only the rows are grouped by their key set, as the grouping stage does for remove.
+    """
+    group_by = "attr_hash"
+    if key_only:
+        cursor.connection.create_function("attr_keys", 1, get_custom_attribute_keys, deterministic=True)
+        group_by = "attr_keys(payload_custom_attributes)"
+    cursor.execute(f"""
+        SELECT COALESCE(SUM((count_asset_ids + ? - 1) / ?), 0)
+        FROM (
+            SELECT COUNT(asset_id) AS count_asset_ids
+            FROM {table_name}
+            GROUP BY {group_by}
+        )
+    """, (max_asset_ids, max_asset_ids))
+    return cursor.fetchone()[0]
+
+
+def upsert_applied_assets(cursor, table_name: str, batches) -> int:
+    """
+    Explodes successful execution log batches, (asset_ids, payload_custom_attributes, run_id) tuples in
+    the order they were sent, into one row per asset ID of table_name, a temp table keyed by asset_id.
+    Batches of the same run merge, as --optimize-grouping sends the keys of an asset in several calls,
+    a later run replaces the attributes of the asset.  Returns the number of asset rows read.
+    """
+    asset_rows = 0
+    for asset_ids, payload_custom_attributes, run_id in batches:
+        rows = [(asset_id.strip().replace('\ufeff', ''), payload_custom_attributes, run_id)
+                for asset_id in (asset_ids or '').split(',') if asset_id.strip()]
+        cursor.executemany(f"""
+            INSERT INTO {table_name} (asset_id, payload_custom_attributes, run_id) VALUES (?, ?, ?)
+            ON CONFLICT (asset_id) DO UPDATE
+            SET payload_custom_attributes = CASE WHEN run_id = excluded.run_id
+                    THEN merge_attributes(payload_custom_attributes, excluded.payload_custom_attributes)
+                    ELSE excluded.payload_custom_attributes END,
+                run_id = excluded.run_id
+        """, rows)
+        asset_rows += len(rows)
+    return asset_rows
+
+
+def create_applied_table(cursor) -> None:
+    """Creates qualys_attribute_payloads_applied, the custom attributes applied per asset and function."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS qualys_attribute_payloads_applied (
+            api_function              TEXT,
+            asset_id                  TEXT,
+            payload_custom_attributes TEXT,
+            PRIMARY KEY (api_function, asset_id)
+        ) WITHOUT ROWID
+    """)
+
+
+def update_applied_table(conn, log_table: str, api_function: str) -> int:
+    """
+    Adds the assets of the successful batches of log_table to qualys_attribute_payloads_applied, over
+    the baseline state the delta stage carried forward, so the database of every run holds the full
+    applied state and can be the --baseline-db of the next run.  Returns the number of assets written.
+    """
+    conn.create_function("merge_attributes", 2, merge_custom_attributes, deterministic=True)
+    cursor = conn.cursor()
+    create_applied_table(cursor)
+    cursor.execute("DROP TABLE IF EXISTS temp.run_applied")
+    cursor.execute("CREATE TEMP TABLE run_applied (asset_id TEXT PRIMARY KEY, payload_custom_attributes TEXT, "
+                   "run_id INTEGER)")
+    # Rows from before the outcome column count status 200 as success
+    read_cursor = conn.cursor()
+    read_cursor.execute(f"""
+        SELECT asset_ids, payload_custom_attributes, 0
+        FROM {log_table}
+        WHERE CAST(status AS TEXT) = '200' AND (outcome = 'success' OR outcome IS NULL)
+        ORDER BY rowid
+    """)
+    upsert_applied_assets(cursor, "temp.run_applied", read_cursor)
+    cursor.execute("""
+        INSERT OR REPLACE INTO qualys_attribute_payloads_applied (api_function, asset_id, payload_custom_attributes)
+        SELECT ?, asset_id, payload_custom_attributes FROM temp.run_applied
+    """, (api_function,))
+    applied_assets = cursor.rowcount
+    cursor.execute("DROP TABLE temp.run_applied")
+    return applied_assets
+
+
+def create_delta_payload_table(_db_path: Path, _baseline_db_path: Path, max_asset_ids: int = 100,
+                               source_table: str = "qualys_attribute_payloads_clean",
+                               new_table_name: str = "qualys_attribute_payloads_delta",
+                               key_only: bool = False, api_function: str = "add",
+                               _database: Optional[QualysRunDatabase] = None) -> None:
+    """
+    Delta mode.  Compares the clean payloads of this run against the assets previous runs applied
+    successfully and keeps only new or changed assets for the grouping, split and execute stages.
+
+    The baseline is the qualys_attribute_payloads_applied table of the baseline database, the custom
+    attributes applied per asset by that run and the runs it was a delta of.  It is copied into the
+    applied table of this run, where the execute stage adds the assets this run applies, so a chain of
+    delta runs each only sends what changed since the previous one.  Only the assets of api_function
+    are read.  With key_only, for remove, only the keys are compared.
+
+    Databases from before the applied table are read from their execution log instead: every asset ID
+    of a successful batch (status 200, outcome success) with the batch's payload_custom_attributes,
+    merged over all batches of the asset when --optimize-grouping sent its keys in several calls.  A
+    persistent database is read from run_execution_log, the successful batches of every run of
+    api_function, where the latest run of an asset replaces its attributes.  A persistent database can
+    be its own baseline; it is then read on the stage connection.  Assets from failed, bisected or
+    dry-run batches are not part of the baseline and are therefore sent again.
+
+    Args:
+        _db_path (Path): Path to the SQLite database file.
+        _baseline_db_path (Path): Path to the database file of the last successful run.
+        max_asset_ids (int): Maximum number of asset_ids per API call, used to predict call counts.
+        source_table (str): Name of the source table (default: qualys_attribute_payloads_clean).
+        new_table_name (str): Name of the new table (default: qualys_attribute_payloads_delta).
+        key_only (bool): Compare and predict calls by key set only, for the remove function.
+        api_function (str): Function of the run, selects the baseline assets (default: add).
+        _database (QualysRunDatabase): Run database shared by the stages of the run (optional).
+
+    Raises:
+        WorkflowError: If a database file or the baseline execution log does not exist.
+    """
+    _db_path = Path(_db_path)
+    _baseline_db_path = Path(_baseline_db_path)
+    if not database_exists(_db_path, _database):
+        raise WorkflowError(f"Database file not found: {_db_path}")
+    if not _baseline_db_path.exists():
+        raise WorkflowError(f"Baseline database file not found: {_baseline_db_path}")
+
+    applied_table = "qualys_attribute_payloads_applied"
+    baseline_table = "qualys_attribute_payloads_transformed_execution_log"
+    history_table = "run_execution_log"
+    try:
+        print(f"Creating '{new_table_name}' from {source_table} against baseline {_baseline_db_path}...")
+        with connect_database(_db_path, _database) as conn:
+            conn.create_function("attr_hash", 1, hash_custom_attributes, deterministic=True)
+            conn.create_function("merge_attributes", 2, merge_custom_attributes, deterministic=True)
+            conn.create_function("attr_keys", 1, get_custom_attribute_keys, deterministic=True)
+            cursor = conn.cursor()
+
+            cursor.execute("DROP TABLE IF EXISTS temp.baseline_applied")
+            cursor.execute("CREATE TEMP TABLE baseline_applied (asset_id TEXT PRIMARY KEY, "
+                           "payload_custom_attributes TEXT, run_id INTEGER)")
+
+            # A persistent database that is its own baseline is read on the stage connection
+            own_baseline = _baseline_db_path.resolve() == _db_path.resolve()
+            baseline_conn = conn if own_baseline else \
+                sqlite3.connect(f"file:{_baseline_db_path}?mode=ro", uri=True)
+            try:
+                baseline_cursor = baseline_conn.cursor()
+                baseline_cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name IN (?, ?, ?)",
+                                        (applied_table, history_table, baseline_table))
+                tables = {row[0] for row in baseline_cursor.fetchall()}
+                if applied_table in tables:
+                    # The full applied state, one row per asset
+                    baseline_cursor.execute(f"""
+                        SELECT asset_id, payload_custom_attributes, 0
+                        FROM {applied_table}
+                        WHERE api_function = ?
+                    """, (api_function,))
+                elif history_table in tables:
+                    # The history of a persistent database, in run order so later runs win
+                    baseline_cursor.execute(f"""
+                        SELECT l.asset_ids, l.payload_custom_attributes, l.run_id
+                        FROM {history_table} l
+                        JOIN runs r ON r.run_id = l.run_id
+                        WHERE CAST(l.status AS TEXT) = '200' AND l.outcome = 'success' AND r.api_function = ?
+                        ORDER BY l.run_id, l.group_number, l.batch_number
+                    """, (api_function,))
+                elif baseline_table in tables:
+                    # Baselines from before the outcome column count every status 200 batch as applied
+                    baseline_cursor.execute(f"PRAGMA table_info({baseline_table})")
+                    success_filter = "AND outcome = 'success'" \
+                        if 'outcome' in {column[1] for column in baseline_cursor.fetchall()} else ""
+                    baseline_cursor.execute(f"""
+                        SELECT asset_ids, payload_custom_attributes, 0
+                        FROM {baseline_table}
+                        WHERE CAST(status AS TEXT) = '200' {success_filter}
+                        ORDER BY group_number, batch_number
+                    """)
+                else:
+                    raise WorkflowError(f"Baseline database {_baseline_db_path} has no {baseline_table} table")
+                baseline_assets = upsert_applied_assets(cursor, "temp.baseline_applied", baseline_cursor)
+            finally:
+                if not own_baseline:
+                    baseline_conn.close()
+            print(f"Loaded {baseline_assets} successfully applied asset rows from baseline {_baseline_db_path}")
+
+            # The baseline state is carried forward into the applied table of this run
+            create_applied_table(cursor)
+            cursor.execute(f"DELETE FROM {applied_table} WHERE api_function = ?", (api_function,))
+            cursor.execute(f"""
+                INSERT INTO {applied_table} (api_function, asset_id, payload_custom_attributes)
+                SELECT ?, asset_id, payload_custom_attributes FROM temp.baseline_applied
+            """, (api_function,))
+
+            cursor.execute(f"DROP TABLE IF EXISTS {new_table_name}")
+            cursor.execute(f"""
+                CREATE TABLE {new_table_name} (
+                    asset_id                  TEXT,
+                    payload                   TEXT,
+                    payload_custom_attributes TEXT,
+                    change_type               TEXT,
+                    asset_key                 TEXT,
+                    attr_hash                 TEXT
+                )
+            """)
+            if key_only:
+                compare = "attr_hash(attr_keys(b.payload_custom_attributes)) != " \
+                          "attr_hash(attr_keys(c.payload_custom_attributes))"
+            else:
+                compare = "attr_hash(b.payload_custom_attributes) != c.attr_hash"
+            cursor.execute(f"""
+                INSERT INTO {new_table_name} (asset_id, payload, payload_custom_attributes, change_type,
+                                              asset_key, attr_hash)
+                SELECT c.asset_id, c.payload, c.payload_custom_attributes,
+                       CASE WHEN b.asset_id IS NULL THEN 'new' ELSE 'changed' END, c.asset_key, c.attr_hash
+                FROM {source_table} c
+                LEFT JOIN temp.baseline_applied b
+                    ON b.asset_id = TRIM(REPLACE(COALESCE(c.asset_id, ''), char(65279), ''))
+                WHERE b.asset_id IS NULL
+                   OR {compare}
+            """)
+            cursor.execute("DROP TABLE temp.baseline_applied")
+            conn.commit()
+
+            cursor.execute(f"SELECT change_type, COUNT(*) FROM {new_table_name} GROUP BY change_type")
+            change_counts = dict(cursor.fetchall())
+            cursor.execute(f"SELECT COUNT(*) FROM {source_table}")
+            source_rows = cursor.fetchone()[0]
+            unchanged_rows = source_rows - sum(change_counts.values())
+
+            full_api_calls = count_predicted_api_calls(cursor, source_table, max_asset_ids, key_only)
+            delta_api_calls = count_predicted_api_calls(cursor, new_table_name, max_asset_ids, key_only)
+            reduction = (1 - delta_api_calls / full_api_calls) * 100 if full_api_calls else 0.0
+
+            print(f"Created '{new_table_name}' with {change_counts.get('new', 0)} new and "
+                  f"{change_counts.get('changed', 0)} changed assets, skipped {unchanged_rows} unchanged assets.")
+            print(f"Delta mode API calls: {delta_api_calls} instead of {full_api_calls} ({reduction:.1f}% reduction).")
+            q_run_summary['Delta assets'] = (f"{change_counts.get('new', 0)} new, "
+                                             f"{change_counts.get('changed', 0)} changed, "
+                                             f"{unchanged_rows} unchanged")
+            q_run_summary['Delta API calls'] = \
+                f"{delta_api_calls} instead of {full_api_calls} ({reduction:.1f}% reduction)"
+
+    except sqlite3.Error as e:
+        error_msg = f"SQLite error in '{new_table_name}' creation: {e}"
+        raise WorkflowError(error_msg) from e
+
+
+def custom_attributes_already_applied(payload_custom_attributes: Optional[str],
+                                      current_custom_attributes: Optional[str],
+                                      _q_api_function: str) -> int:
+    """
+    SQLite function for the prefetch stage.  Returns 1 when the API call for an asset would not change
+    Qualys: for add and update every target key already holds the target value, for remove none of
+    the target keys exist.  Returns 0 when the asset was not found in Qualys.
+    """
+    if current_custom_attributes is None:
+        return 0
+    target = json.loads((payload_custom_attributes or '[]').replace('\ufeff', ''))
+    current = json.loads(current_custom_attributes)
+    if _q_api_function == 'remove':
+        return int(all(attribute['key'] not in current for attribute in target))
+    return int(all(current.get(attribute['key']) == attribute['value'] for attribute in target))
+
+
+def prefetch_qualys_custom_attributes(
+        _db_path: Path,
+        _q_username: str = "",
+        _q_password: str = "",
+        _q_api_fqdn: str = "",
+        _q_api_function: str = "",
+        source_table: str = "qualys_attribute_payloads_clean",
+        current_table: str = "qualys_asset_current_attributes",
+        new_table_name: str = "qualys_attribute_payloads_pending",
+        page_size: int = 100,
+        _rate_limiter: Optional[QualysRateLimiter] = None,
+        _database: Optional[QualysRunDatabase] = None) -> None:
+    """
+    Prefetch stage.  Pages through the Qualys asset search API for the asset IDs in source_table, stores
+    the custom attributes Qualys currently holds in current_table and writes the assets whose call
+    would change something to new_table_name.  Assets whose target attributes already match are
+    dropped before grouping, so no write call is made for them.
+
+    Args:
+        _db_path (Path): Path to the SQLite database file.
+        _q_username (str): Qualys API username.
+        _q_password (str): Qualys API password.
+        _q_api_fqdn (str): Qualys API FQDN, or a URL with scheme for a local stub server.
+        _q_api_function (str): Function add, update, remove.
+        source_table (str): Name of the source table (default: qualys_attribute_payloads_clean).
+        current_table (str): Name of the current attributes table (default: qualys_asset_current_attributes).
+        new_table_name (str): Name of the new table (default: qualys_attribute_payloads_pending).
+        page_size (int): Asset IDs per search call (default: 100).
+        _rate_limiter (QualysRateLimiter): Run wide rate limiter shared with the execute stage (optional).
+        _database (QualysRunDatabase): Run database shared by the stages of the run (optional).
+
+    Raises:
+        WorkflowError: If the database file does not exist or an asset search call fails.
+    """
+    _db_path = Path(_db_path)
+    if not database_exists(_db_path, _database):
+        raise WorkflowError(f"Database file not found: {_db_path}")
+
+    try:
+        print(f"Prefetching current custom attributes for assets in {source_table} "
+              f"from {get_api_url(_q_api_fqdn, q_api_search_endpoint)}...")
+        with connect_database(_db_path, _database) as conn:
+            conn.create_function("custom_attributes_already_applied", 3, custom_attributes_already_applied,
+                                 deterministic=True)
+            cursor = conn.cursor()
+
+            cursor.execute(f"DROP TABLE IF EXISTS {current_table}")
+            cursor.execute(f"""
+                CREATE TABLE {current_table} (
+                    asset_id          TEXT PRIMARY KEY,
+                    custom_attributes TEXT
+                )
+            """)
+
+            # Page through the asset IDs on a separate read cursor of the same connection, so memory stays
+            # flat however many assets there are; the current attributes are written through cursor meanwhile
+            asset_id_sql = f"""
+                SELECT DISTINCT TRIM(REPLACE(COALESCE(asset_id, ''), char(65279), ''))
+                FROM {source_table}
+                WHERE TRIM(REPLACE(COALESCE(asset_id, ''), char(65279), '')) <> ''
+            """
+            asset_count = cursor.execute(f"SELECT COUNT(*) FROM ({asset_id_sql})").fetchone()[0]
+            read_cursor = conn.cursor()
+            read_cursor.execute(asset_id_sql)
+
+            assets_found = 0
+            assets_searched = 0
+            with QualysApiClient(_q_api_fqdn, _q_username, _q_password, pool_size=1,
+                                 rate_limiter=_rate_limiter) as client:
+                for page_number, rows in enumerate(iter(lambda: read_cursor.fetchmany(page_size), []), 1):
+                    page = [row[0] for row in rows]
+                    current_attributes = search_qualys_assets(
+                        _q_api_fqdn=_q_api_fqdn,
+                        _q_api_endpoint=q_api_search_endpoint,
+                        _q_username=_q_username,
+                        _q_password=_q_password,
+                        _asset_ids=page,
+                        _client=client)
+                    cursor.executemany(
+                        f"INSERT OR REPLACE INTO {current_table} (asset_id, custom_attributes) VALUES (?, ?)",
+                        [(asset_id, json.dumps(attributes, sort_keys=True))
+                         for asset_id, attributes in current_attributes.items()])
+                    assets_found += len(current_attributes)
+                    assets_searched += len(page)
+                    if page_number % 100 == 0:
+                        conn.commit()
+                        print(f"Prefetched {assets_searched}/{asset_count} asset IDs")
+            conn.commit()
+            print(f"Prefetched {assets_searched} asset IDs, {assets_found} found in Qualys")
+
+            cursor.execute(f"DROP TABLE IF EXISTS {new_table_name}")
+            cursor.execute(f"CREATE TABLE {new_table_name} AS SELECT * FROM {source_table} WHERE 0")
+            cursor.execute(f"""
+                INSERT INTO {new_table_name}
+                SELECT s.*
+                FROM {source_table} s
+                LEFT JOIN {current_table} c
+                    ON c.asset_id = TRIM(REPLACE(COALESCE(s.asset_id, ''), char(65279), ''))
+                WHERE custom_attributes_already_applied(s.payload_custom_attributes, c.custom_attributes, ?) = 0
+            """, (_q_api_function,))
+            rows_pending = cursor.rowcount
+            conn.commit()
+
+            cursor.execute(f"SELECT COUNT(*) FROM {source_table}")
+            source_rows = cursor.fetchone()[0]
+            print(f"Created '{new_table_name}' with {rows_pending} assets to {_q_api_function}, "
+                  f"skipped {source_rows - rows_pending} assets whose custom attributes already match.")
+            q_run_summary['Prefetch skipped'] = (f"{source_rows - rows_pending} of {source_rows} assets "
+                                                 f"already up to date")
+
+    except sqlite3.Error as e:
+        error_msg = f"SQLite error in '{new_table_name}' creation: {e}"
+        raise WorkflowError(error_msg) from e
+
+
+def count_key_block_api_calls(asset_codes: Dict[tuple, int], block: Tuple[int, ...], max_asset_ids: int) -> int:
+    """
+    Returns the API calls needed to send the keys of block to every asset, grouping assets by their values
+    for those keys.  asset_codes maps a tuple of value codes per key (0 for a missing key) to the number
+    of assets holding it.  Assets without any key of the block need no call.
+    """
+    counts = {}
+    for codes, count in asset_codes.items():
+        signature = tuple(codes[index] for index in block)
+        if any(signature):
+            counts[signature] = counts.get(signature, 0) + count
+    return sum((count + max_asset_ids - 1) // max_asset_ids for count in counts.values())
+
+
+def plan_key_blocks(asset_codes: Dict[tuple, int], key_count: int,
+                    max_asset_ids: int) -> Tuple[List[Tuple[int, ...]], int]:
+    """
+    Greedy plan of key blocks with the fewest API calls.  Starts with one block per key, the (key, value)
+    pair grouping, and merges the two blocks that save the most calls until no merge saves any.
+
+    Returns:
+        Tuple[List[Tuple[int, ...]], int]: The key blocks, as key indexes, and their predicted API calls.
+    """
+    costs = {}
+
+    def cost(block):
+        if block not in costs:
+            costs[block] = count_key_block_api_calls(asset_codes, block, max_asset_ids)
+        return costs[block]
+
+    blocks = [(index,) for index in range(key_count)]
+    while len(blocks) > 1:
+        best_saving, best_pair = 0, None
+        for i in range(len(blocks)):
+            for j in range(i + 1, len(blocks)):
+                merged = tuple(sorted(blocks[i] + blocks[j]))
+                saving = cost(blocks[i]) + cost(blocks[j]) - cost(merged)
+                if saving > best_saving:
+                    best_saving, best_pair = saving, (i, j)
+        if best_pair is None:
+            break
+        i, j = best_pair
+        merged = tuple(sorted(blocks[i] + blocks[j]))
+        blocks = [block for index, block in enumerate(blocks) if index not in best_pair] + [merged]
+    return sorted(blocks), sum(cost(block) for block in blocks)
+
+
+def create_optimized_grouping_table(_db_path: Path, max_asset_ids: int = 100,
+                                    source_table: str = "qualys_attribute_payloads_clean",
+                                    new_table_name: str = "qualys_attribute_payloads_optimized",
+                                    key_only: bool = False,
+                                    _database: Optional[QualysRunDatabase] = None) -> None:
+    """
+    Grouping optimizer.  The grouping stage sends one call per distinct full custom attribute tuple, so
+    assets that share most values but differ in one key end up in groups of a few assets.  An API call
+    may carry any subset of an asset's keys, so the keys can instead be sent in blocks, each block
+    grouped by its own values.  Three plans are predicted with max_asset_ids IDs per call:
+
+    - tuple:  one block with every key, the grouping stage as is.
+    - pair:   one block per key, one call per (key, value) pair and 100 assets.
+    - subset: blocks of partial key subsets, see plan_key_blocks.
+
+    The plan with the fewest calls is written to new_table_name as one row per asset and block, holding
+    the asset's attributes for the keys of the block, so that the grouping stage groups by block values.
+    With the tuple plan the rows are copied unchanged.  Predicted calls per plan are printed and added
+    to the run summary.  With key_only, for remove, assets are grouped by the keys they hold only.
+
+    Args:
+        _db_path (Path): Path to the SQLite database file.
+        max_asset_ids (int): Maximum number of asset_ids per API call.
+        source_table (str): Name of the source table (default: qualys_attribute_payloads_clean).
+        new_table_name (str): Name of the new table (default: qualys_attribute_payloads_optimized).
+        key_only (bool): Predict calls by key set only, for the remove function.
+        _database (QualysRunDatabase): Run database shared by the stages of the run (optional).
+
+    Raises:
+        WorkflowError: If the database file does not exist or a database error occurs.
+    """
+    _db_path = Path(_db_path)
+    if not database_exists(_db_path, _database):
+        raise WorkflowError(f"Database file not found: {_db_path}")
 
-            # Add group numbers as integers starting from 1
+    try:
+        print(f"Creating '{new_table_name}' from {source_table} with the grouping plan of fewest API calls...")
+        with connect_database(_db_path, _database) as conn:
+            cursor = conn.cursor()
+
+            # Code each asset's values per key, 0 for a missing key, and count assets per code tuple
+            keys = {}
+            values = {}
+            asset_value_codes = []
+            cursor.execute(f"SELECT payload_custom_attributes FROM {source_table}")
+            for (payload_custom_attributes,) in cursor:
+                attributes = json.loads((payload_custom_attributes or '[]').replace('\ufeff', ''))
+                value_codes = {}
+                for attribute in attributes:
+                    key_index = keys.setdefault(attribute['key'], len(keys))
+                    value = None if key_only else attribute['value']
+                    value_codes[key_index] = values.setdefault((key_index, value), len(values) + 1)
+                asset_value_codes.append(value_codes)
+            asset_codes = {}
+            for value_codes in asset_value_codes:
+                codes = tuple(value_codes.get(index, 0) for index in range(len(keys)))
+                asset_codes[codes] = asset_codes.get(codes, 0) + 1
+            del asset_value_codes
+            key_names = list(keys)
+
+            plans = {
+                'tuple': ([tuple(range(len(keys)))],
+                          count_predicted_api_calls(cursor, source_table, max_asset_ids, key_only)),
+                'pair': ([(index,) for index in range(len(keys))],
+                         sum(count_key_block_api_calls(asset_codes, (index,), max_asset_ids)
+                             for index in range(len(keys)))),
+                'subset': plan_key_blocks(asset_codes, len(keys), max_asset_ids),
+            }
+            # Ties keep the full tuple, which applies all keys of an asset in one call
+            chosen = min(plans, key=lambda name: (plans[name][1], name != 'tuple'))
+            blocks = plans[chosen][0]
+            for name, (_, calls) in plans.items():
+                print(f"Grouping plan {name}: {calls} predicted API calls.")
+            block_names = ' | '.join('+'.join(key_names[index] for index in block) for block in blocks)
+            print(f"Chosen grouping plan: {chosen} with {plans[chosen][1]} predicted API calls, "
+                  f"key blocks: {block_names or 'none'}")
+            q_run_summary['Grouping plans'] = ', '.join(f"{name}={calls}" for name, (_, calls) in plans.items())
+            q_run_summary['Grouping plan chosen'] = f"{chosen} ({plans[chosen][1]} API calls)"
+
+            cursor.execute(f"DROP TABLE IF EXISTS {new_table_name}")
             cursor.execute(f"""
-                UPDATE {new_table_name}
-                SET group_number = (
-                    SELECT rowid
-                    FROM {new_table_name} AS t
-                    WHERE t.rowid = {new_table_name}.rowid
+                CREATE TABLE {new_table_name} (
+                    asset_id                  TEXT,
+                    payload                   TEXT,
+                    payload_custom_attributes TEXT,
+                    asset_key                 TEXT,
+                    attr_hash                 TEXT
                 )
             """)
-
-            # Commit the changes
+            if chosen == 'tuple':
+                cursor.execute(f"""
+                    INSERT INTO {new_table_name} (asset_id, payload, payload_custom_attributes, asset_key, attr_hash)
+                    SELECT asset_id, payload, payload_custom_attributes, asset_key, attr_hash FROM {source_table}
+                """)
+            else:
+                key_blocks = [{key_names[index] for index in block} for block in blocks]
+                read_cursor = conn.cursor()
+                read_cursor.execute(f"SELECT asset_id, payload, payload_custom_attributes, asset_key "
+                                    f"FROM {source_table}")
+                while True:
+                    rows = read_cursor.fetchmany(q_insert_batch_size)
+                    if not rows:
+                        break
+                    block_rows = []
+                    for asset_id, payload, payload_custom_attributes, asset_key in rows:
+                        attributes = json.loads((payload_custom_attributes or '[]').replace('\ufeff', ''))
+                        for key_block in key_blocks:
+                            block_attributes = [attribute for attribute in attributes if attribute['key'] in key_block]
+                            if block_attributes:
+                                block_json = json.dumps(block_attributes)
+                                block_rows.append((asset_id, payload, block_json, asset_key,
+                                                   q_payload_builder.attributes_hash(block_json)))
+                    cursor.executemany(f"INSERT INTO {new_table_name} (asset_id, payload, payload_custom_attributes, "
+                                       "asset_key, attr_hash) VALUES (?, ?, ?, ?, ?)", block_rows)
             conn.commit()
-            print(f"Created or replaced table '{new_table_name}' with {cursor.rowcount} rows.")
+            cursor.execute(f"SELECT COUNT(*) FROM {new_table_name}")
+            print(f"Created '{new_table_name}' with {cursor.fetchone()[0]} asset rows.")
 
     except sqlite3.Error as e:
         error_msg = f"SQLite error in '{new_table_name}' creation: {e}"
         raise WorkflowError(error_msg) from e
-    except Exception as e:
-        error_msg = f"Unexpected error creating grouped table '{new_table_name}': {e}"
-        raise WorkflowError(error_msg) from e
 
 
-def create_non_duplicate_payload_table(
-        _db_path: Path,
-        main_table="qualys_attribute_payloads",
-        dup_table="qualys_attribute_payloads_duplicates",
-        new_table="qualys_attribute_payloads_clean",
-        case_insensitive=True
-):
+def get_payload_body_base_bytes(payload_custom_attributes: str) -> int:
     """
-    Creates a new table with non-duplicate rows from main_table (excluding asset_ids in dup_table).
-    Drops new_table if it already exists.
-
-    Args:
-        _db_path (Path): Path to SQLite database
-        main_table (str): Source table
-        dup_table (str): Table with duplicates to exclude
-        new_table (str): Output clean table
-        case_insensitive (bool): Match asset_id case-insensitively (recommended for TEXT)
-
-    Returns:
-        int: Number of rows inserted
+    Returns the serialized length in bytes of the request body built for a group by the transform stage,
+    with an empty asset ID list.  Each asset ID adds its length plus one for the separating comma.  The
+    operation is counted as 'remove', the longest of add, update and remove.
     """
-    conn = sqlite3.connect(_db_path)
-    cursor = conn.cursor()
-
-    try:
-        # Step 1: Drop new table if it exists
-        cursor.execute(f"DROP TABLE IF EXISTS {new_table}")
-        print(f"Dropped table if existed: {new_table}")
-
-        # Step 2: Create new table with same schema (empty)
-        cursor.execute(f"""
-            CREATE TABLE {new_table} (
-                asset_id                  TEXT,
-                payload                   TEXT,
-                payload_custom_attributes TEXT
-            )
-        """)
-        print(f"Created table: {new_table}")
-
-        # Step 3: Build JOIN condition
-        if case_insensitive:
-            join_condition = "UPPER(TRIM(m.asset_id)) = UPPER(TRIM(d.asset_id))"
-        else:
-            join_condition = "m.asset_id = d.asset_id"
-
-        # Step 4: Insert non-duplicate rows
-        insert_query = f"""
-            INSERT INTO {new_table} (asset_id, payload, payload_custom_attributes)
-            SELECT m.asset_id, m.payload, m.payload_custom_attributes
-            FROM {main_table} m
-            LEFT JOIN {dup_table} d ON {join_condition}
-            WHERE d.asset_id IS NULL
-        """
-        cursor.execute(insert_query)
-        rows_inserted = cursor.rowcount
+    return len(q_payload_builder.batch_body('', payload_custom_attributes, 'remove').encode('utf-8'))
 
-        conn.commit()
-        print(f"Success: Inserted {rows_inserted} non-duplicate rows into {new_table}")
-        return rows_inserted
 
-    except sqlite3.Error as e:
-        conn.rollback()
-        print(f"Database error: {e}")
-        raise
-    finally:
-        conn.close()
+def pack_asset_ids(ids_list: List[str], max_asset_ids: int, max_body_bytes: Optional[int] = None,
+                   base_bytes: int = 0) -> List[str]:
+    """
+    Packs asset IDs into comma-separated chunks of at most max_asset_ids IDs and, with max_body_bytes, at
+    most max_body_bytes bytes of request body, where base_bytes is the body size without any asset ID
+    (see get_payload_body_base_bytes).  A chunk always holds at least one ID.
+    """
+    if max_body_bytes is None:
+        return [','.join(ids_list[i:i + max_asset_ids]) for i in range(0, len(ids_list), max_asset_ids)]
+    chunks = []
+    chunk = []
+    chunk_bytes = base_bytes
+    for asset_id in ids_list:
+        id_bytes = len(asset_id.encode('utf-8')) + (1 if chunk else 0)
+        if chunk and (len(chunk) >= max_asset_ids or chunk_bytes + id_bytes > max_body_bytes):
+            chunks.append(','.join(chunk))
+            chunk = []
+            chunk_bytes = base_bytes
+            id_bytes -= 1
+        chunk.append(asset_id)
+        chunk_bytes += id_bytes
+    chunks.append(','.join(chunk))
+    return chunks
 
 
 def create_split_payloads_table(_db_path: Path, max_asset_ids: int = 100,
-                               new_table_name: str = "qualys_attribute_payloads_split") -> None:
+                               new_table_name: str = "qualys_attribute_payloads_split",
+                               max_body_bytes: Optional[int] = None,
+                               asset_id_type: str = 'text',
+                               members_table: str = "qualys_attribute_payloads_group_members",
+                               _database: Optional[QualysRunDatabase] = None) -> None:
     """
     Creates or replaces a SQLite table from qualys_attribute_payloads_grouped, splitting
     rows with more than max_asset_ids (default 100) into multiple rows, each with at most
@@ -847,10 +3054,22 @@ def create_split_payloads_table(_db_path: Path, max_asset_ids: int = 100,
     in each row. Includes group_number from the source table and assigns batch_number
     starting from 1 for each group.
 
+    With max_body_bytes the chunks are packed by request body size as well: a chunk is closed when
+    adding the next asset ID would make the serialized request body longer than max_body_bytes, or
+    when it holds max_asset_ids IDs, whichever comes first.  A chunk always holds at least one ID.
+
+    With asset_id_type 'integer' the asset IDs are read from members_table in primary key order and
+    sliced into batches with ROW_NUMBER, or packed by body size with max_body_bytes, instead of
+    splitting the asset_ids lists.  Groups without members get no batch.
+
     Args:
         _db_path (Path): Path to the SQLite database file.
         max_asset_ids (int): Maximum number of asset_ids per row (default: 100).
         new_table_name (str): Name of the new table (default: qualys_attribute_payloads_split).
+        max_body_bytes (int): Maximum request body size in bytes, None to split by max_asset_ids only.
+        asset_id_type (str): 'text' or 'integer' (default: 'text').
+        members_table (str): Name of the group membership table for 'integer'.
+        _database (QualysRunDatabase): Run database shared by the stages of the run (optional).
 
     Raises:
         FileNotFoundError: If the database file does not exist.
@@ -858,7 +3077,7 @@ def create_split_payloads_table(_db_path: Path, max_asset_ids: int = 100,
         Exception: For other unexpected errors.
     """
     _db_path = Path(_db_path)
-    if not _db_path.exists():
+    if not database_exists(_db_path, _database):
         raise FileNotFoundError(f"Database file not found: {_db_path}")
 
     def split_into_chunks(_asset_ids: str, max_size: int) -> List[str]:
@@ -872,10 +3091,66 @@ def create_split_payloads_table(_db_path: Path, max_asset_ids: int = 100,
             return ['']
         return [','.join(ids_list[i:i + max_size]) for i in range(0, len(ids_list), max_size)]
 
+    def pack_into_chunks(_asset_ids: str, max_size: int, base_bytes: int) -> List[str]:
+        """Packs a comma-separated string into chunks of at most max_size items and max_body_bytes bytes."""
+        ids_list = [id.strip() for id in _asset_ids.replace('\ufeff', '').split(',') if id.strip()]
+        if not ids_list:
+            return ['']
+        return pack_asset_ids(ids_list, max_size, max_body_bytes, base_bytes)
+
+    def slice_group_members(_cursor, _write_cursor) -> Tuple[int, int]:
+        """Inserts the batches of every group of members_table, returns the groups and rows inserted."""
+        _cursor.execute(f"""
+            SELECT group_number, asset_id,
+                   (ROW_NUMBER() OVER (PARTITION BY group_number ORDER BY asset_id) - 1) / ? + 1 AS batch_number
+            FROM {members_table}
+            ORDER BY group_number, asset_id
+        """, (max_asset_ids,))
+        batches = []
+        groups_sliced = 0
+        batches_inserted = 0
+        for group_number, group_rows in groupby(_cursor, key=lambda member: member[0]):
+            # group_number is the rowid of the grouped table, so the group is a rowid lookup
+            payload, payload_custom_attributes = _write_cursor.connection.execute(
+                "SELECT payload, payload_custom_attributes FROM qualys_attribute_payloads_grouped WHERE rowid = ?",
+                (group_number,)).fetchone()
+            if max_body_bytes is None:
+                # Consecutive members of the same ROW_NUMBER slice form a batch
+                chunks = []
+                batch_number = None
+                for _, asset_id, member_batch_number in group_rows:
+                    if member_batch_number != batch_number:
+                        batch_number = member_batch_number
+                        chunk = []
+                        chunks.append(chunk)
+                    chunk.append(str(asset_id))
+            else:
+                base_bytes = get_payload_body_base_bytes(payload_custom_attributes)
+                if base_bytes >= max_body_bytes:
+                    print(f"  Request body without asset IDs is {base_bytes} bytes, over the "
+                          f"{max_body_bytes} bytes limit. Sending one asset ID per call.")
+                chunks = [chunk.split(',') for chunk in pack_asset_ids(
+                    [str(member[1]) for member in group_rows], max_asset_ids, max_body_bytes, base_bytes)]
+            groups_sliced += 1
+            for batch_num, chunk in enumerate(chunks, 1):
+                batches.append((','.join(chunk), payload, payload_custom_attributes, len(chunk), group_number,
+                                batch_num))
+            if len(batches) >= 1000:
+                _write_cursor.executemany(
+                    f"INSERT INTO {new_table_name} (asset_ids, payload, payload_custom_attributes, "
+                    "count_asset_ids, group_number, batch_number) VALUES (?, ?, ?, ?, ?, ?)", batches)
+                _write_cursor.connection.commit()
+                batches_inserted += len(batches)
+                batches = []
+                print(f"Committed {batches_inserted} rows to {new_table_name}")
+        _write_cursor.executemany(
+            f"INSERT INTO {new_table_name} (asset_ids, payload, payload_custom_attributes, "
+            "count_asset_ids, group_number, batch_number) VALUES (?, ?, ?, ?, ?, ?)", batches)
+        return groups_sliced, batches_inserted + len(batches)
+
     try:
         print(f"Creating '{new_table_name}' from qualys_attribute_payloads_grouped table...")
-        with sqlite3.connect(_db_path) as conn:
-            conn.execute("PRAGMA foreign_keys=OFF")  # Disable foreign keys for performance
+        with connect_database(_db_path, _database) as conn:
             cursor = conn.cursor()
 
             # Drop and recreate the table to ensure correct schema
@@ -891,16 +3166,23 @@ def create_split_payloads_table(_db_path: Path, max_asset_ids: int = 100,
                 )
             """)
 
-            # Fetch rows from qualys_attribute_payloads_grouped
-            cursor.execute("""
+            # Integer asset IDs are sliced from the group membership table
+            if asset_id_type == 'integer':
+                rows_fetched, rows_inserted = slice_group_members(conn.cursor(), cursor)
+                conn.commit()
+                print(f"Completed: Sliced {rows_fetched} groups of {members_table}, inserted {rows_inserted} rows")
+                return
+
+            # Stream rows from qualys_attribute_payloads_grouped on a separate read cursor of the same
+            # connection, so memory stays flat however many groups there are
+            rows_fetched = cursor.execute("SELECT COUNT(*) FROM qualys_attribute_payloads_grouped").fetchone()[0]
+            read_cursor = conn.cursor()
+            read_cursor.execute("""
                 SELECT asset_ids, payload, payload_custom_attributes, count_asset_ids, group_number
                 FROM qualys_attribute_payloads_grouped
             """)
-            all_rows = cursor.fetchall()  # Fetch all rows to avoid cursor conflict
-
-            rows_fetched = len(all_rows)
             rows_inserted = 0
-            for row_num, _row in enumerate(all_rows, 1):
+            for row_num, _row in enumerate(read_cursor, 1):
                 asset_ids, payload, payload_custom_attributes, count_asset_ids, group_number = _row
                 # Handle None values
                 asset_ids = asset_ids or ''
@@ -909,7 +3191,14 @@ def create_split_payloads_table(_db_path: Path, max_asset_ids: int = 100,
                       f"attributes='{payload_custom_attributes}'")
 
                 # Split asset_ids into chunks
-                chunks = split_into_chunks(asset_ids, max_asset_ids)
+                if max_body_bytes is None:
+                    chunks = split_into_chunks(asset_ids, max_asset_ids)
+                else:
+                    base_bytes = get_payload_body_base_bytes(payload_custom_attributes)
+                    if base_bytes >= max_body_bytes:
+                        print(f"  Request body without asset IDs is {base_bytes} bytes, over the "
+                              f"{max_body_bytes} bytes limit. Sending one asset ID per call.")
+                    chunks = pack_into_chunks(asset_ids, max_asset_ids, base_bytes)
                 print(f"  Split into {len(chunks)} chunks")
                 for batch_num, chunk in enumerate(chunks, 1):  # Start batch_number at 1 for each group
                     chunk_count = len(chunk.split(',')) if chunk and chunk.strip() else 0
@@ -941,41 +3230,28 @@ def create_split_payloads_table(_db_path: Path, max_asset_ids: int = 100,
     except Exception as e:
         print(f"Unexpected error: {e}")
         raise
-    finally:
-        if 'conn' in locals():
-            conn.execute("PRAGMA foreign_keys=ON")  # Re-enable foreign keys
 
 
-def create_transform_payloads_table(_db_path: Path, new_table_name: str = "qualys_attribute_payloads_transformed") -> None:
+def create_transform_payloads_table(_db_path: Path, new_table_name: str = "qualys_attribute_payloads_transformed",
+                                    asset_id_type: str = 'text',
+                                    _database: Optional[QualysRunDatabase] = None) -> None:
     _db_path = Path(_db_path)
-    if not _db_path.exists():
+    if not database_exists(_db_path, _database):
         raise FileNotFoundError(f"Database file not found: {_db_path}")
 
     def transform_payload(payload_json: str, _asset_ids: str, custom_attributes_json: str) -> str:
-        """Transforms the payload JSON by updating value and CustomAttribute fields."""
+        """
+        Builds the payload JSON of a batch with its asset IDs in filters.Criteria and its CustomAttribute
+        list.  payload_json is the template payload of the group, which q_payload_builder already holds.
+        """
         try:
-            # Parse JSON
-            _payload = json.loads(payload_json) if payload_json else {}
-            custom_attributes = json.loads(custom_attributes_json) if custom_attributes_json else []
-
-            # Validate payload structure
-            if not isinstance(_payload, dict) or "ServiceRequest" not in _payload:
-                raise ValueError("Invalid _payload JSON structure")
-
-            # Update _asset_ids in filters.Criteria
-            cleaned_ids = [_id.strip().replace('\ufeff', '') for _id in asset_ids.split(',') if
-                           _id.strip()] if asset_ids else []
-            asset_ids_str = ','.join(cleaned_ids)
-            criteria = _payload.get("ServiceRequest", {}).get("filters", {}).get("Criteria", [])
-            if criteria and isinstance(criteria, list) and len(criteria) > 0:
-                criteria[0]["value"] = asset_ids_str
-
-            # Update CustomAttribute
-            custom_attr_path = _payload.get("ServiceRequest", {}).get("data", {}).get("Asset", {}).get("customAttributes", {}).get("add", {})
-            if custom_attr_path:
-                custom_attr_path["CustomAttribute"] = custom_attributes
-
-            return json.dumps(_payload)
+            # Integer asset IDs are joined without spaces or BOM characters, text IDs are cleaned first
+            if asset_id_type == 'integer':
+                return q_payload_builder.batch_body(_asset_ids or '', custom_attributes_json, 'add')
+            # Update _asset_ids in filters.Criteria and splice in the cached CustomAttribute fragment
+            cleaned_ids = [_id.strip().replace('\ufeff', '') for _id in _asset_ids.split(',') if
+                           _id.strip()] if _asset_ids else []
+            return q_payload_builder.batch_body(cleaned_ids, custom_attributes_json, 'add')
         except json.JSONDecodeError as e:
             print(f"JSON parsing error: {e}")
             raise
@@ -985,8 +3261,7 @@ def create_transform_payloads_table(_db_path: Path, new_table_name: str = "qualy
 
     try:
         print(f"Creating '{new_table_name}' from qualys_attribute_payloads_split table...")
-        with sqlite3.connect(_db_path) as conn:
-            conn.execute("PRAGMA foreign_keys=OFF")  # Disable foreign keys for performance
+        with connect_database(_db_path, _database) as conn:
             cursor = conn.cursor()
 
             cursor.execute(f"DROP TABLE IF EXISTS {new_table_name}")
@@ -1004,16 +3279,15 @@ def create_transform_payloads_table(_db_path: Path, new_table_name: str = "qualy
             """)
             cursor.execute(f"DELETE FROM {new_table_name}")  # Clear existing data
 
-            # Fetch all rows to avoid cursor conflict
-            cursor.execute("""
+            # Stream the split rows on a separate read cursor of the same connection
+            rows_fetched = cursor.execute("SELECT COUNT(*) FROM qualys_attribute_payloads_split").fetchone()[0]
+            read_cursor = conn.cursor()
+            read_cursor.execute("""
                 SELECT asset_ids, payload, payload_custom_attributes, count_asset_ids, group_number, batch_number
                 FROM qualys_attribute_payloads_split
             """)
-            all_rows = cursor.fetchall()
-
-            rows_fetched = len(all_rows)
             rows_inserted = 0
-            for row_num, _row in enumerate(all_rows, 1):
+            for row_num, _row in enumerate(read_cursor, 1):
                 asset_ids, payload, payload_custom_attributes, count_asset_ids, group_number, batch_number = _row
                 asset_ids = asset_ids or ''  # Handle None
                 print(f"Processing row {row_num}/{rows_fetched}: asset_ids length={len(asset_ids)}, "
@@ -1053,50 +3327,6 @@ def create_transform_payloads_table(_db_path: Path, new_table_name: str = "qualy
     except Exception as e:
         print(f"Unexpected error: {e}")
         raise
-    finally:
-        if 'conn' in locals():
-            conn.execute("PRAGMA foreign_keys=ON")  # Re-enable foreign keys
-
-
-def create_payloads_duplicates_table(_db_path: Path, source_table: str = "qualys_attribute_payloads",
-                                     new_table_name: str = "qualys_attribute_payloads_duplicates") -> None:
-    if not _db_path.exists():
-        raise FileNotFoundError(f"Database file not found: {_db_path}")
-
-    try:
-        with sqlite3.connect(_db_path) as conn:
-            cursor = conn.cursor()
-
-            # Drop the table if it exists
-            cursor.execute(f"DROP TABLE IF EXISTS {new_table_name}")
-
-            # Create the new table with duplicates, handling BOM in asset_id
-            cursor.execute(f"""
-                CREATE TABLE {new_table_name} AS
-                SELECT *
-                FROM {source_table}
-                WHERE REPLACE(COALESCE(asset_id, ''), char(65279), '') IN (
-                    SELECT REPLACE(COALESCE(asset_id, ''), char(65279), '') AS cleaned_asset_id
-                    FROM {source_table}
-                    GROUP BY cleaned_asset_id
-                    HAVING COUNT(*) > 1
-                )
-            """)
-
-            # Commit changes
-            conn.commit()
-
-            # Count rows in the new table for feedback
-            cursor.execute(f"SELECT COUNT(*) FROM {new_table_name}")
-            row_count = cursor.fetchone()[0]
-            print(f"Created '{new_table_name}' with {row_count} duplicate rows.")
-
-    except sqlite3.Error as e:
-        print(f"Database error: {e}")
-        raise
-    except Exception as e:
-        print(f"Unexpected error: {e}")
-        raise
 
 
 def update_custom_attribute_operation(_json_data_str, operation):
@@ -1134,6 +3364,132 @@ def update_custom_attribute_operation(_json_data_str, operation):
         raise KeyError(f"Expected key not found in JSON structure: {e}")
 
 
+def replace_payload_asset_ids(_json_data_str: str, _asset_ids: List[str]) -> str:
+    """
+    Returns the ServiceRequest JSON with the asset IDs of its filters.Criteria replaced by _asset_ids,
+    used to build the sub batches of a bisected batch.
+    """
+    updated_data = json.loads(_json_data_str)
+    criteria = updated_data.get("ServiceRequest", {}).get("filters", {}).get("Criteria", [])
+    if criteria and isinstance(criteria, list):
+        criteria[0]["value"] = ','.join(_asset_ids)
+    return json.dumps(updated_data)
+
+
+def latency_percentile(latencies: List[float], percentile: float) -> float:
+    """Returns the nearest-rank percentile of a list of latencies."""
+    ordered = sorted(latencies)
+    rank = max(int(-(-percentile * len(ordered) // 100)), 1)  # ceil without importing math
+    return ordered[rank - 1]
+
+
+def get_retry_backoff_delay(attempt: int, response: Optional[Response] = None) -> float:
+    """
+    Returns the delay in seconds before a deferred retry.  A Retry-After (seconds or HTTP date) or
+    X-RateLimit-ToWait-Sec response header is honoured as given, otherwise the delay is exponential
+    backoff from q_retry_base_delay, capped at q_retry_max_delay, with equal jitter so batches that
+    failed together do not retry together.
+
+    Args:
+        attempt (int): The attempt that failed, starting at 1.
+        response (Response): The failed response, None for a request exception.
+    """
+    if response is not None:
+        for header in ('Retry-After', 'X-RateLimit-ToWait-Sec'):
+            value = response.headers.get(header)
+            if not value:
+                continue
+            try:
+                return max(float(value), 0.0)
+            except ValueError:
+                pass
+            try:
+                retry_at = parsedate_to_datetime(value)
+                return max((retry_at - datetime.now(tz=retry_at.tzinfo)).total_seconds(), 0.0)
+            except (TypeError, ValueError):
+                pass
+    delay = min(q_retry_base_delay * (2 ** (attempt - 1)), q_retry_max_delay)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def iterate_api_call_results(prepared_rows: Iterator[tuple], call_api, workers: int,
+                             max_attempts: int = 10) -> Iterator[Tuple[tuple, Any, int]]:
+    """
+    Runs call_api(prepared_row, attempt) for each prepared row in a thread pool of workers threads and
+    yields (prepared_row, result, attempts) in input order, so results are consumed by a single
+    writer in deterministic order.
+
+    call_api returns (result, retry_delay, children).  A retry_delay other than None parks the row in a
+    deferred retry queue for that many seconds while other rows keep flowing; the row is submitted
+    again when it is due, up to max_attempts attempts.  Children of a final attempt are prepared rows
+    that are called in turn, ahead of due retries and new rows, and are yielded right after their
+    parent in depth first order once the whole tree of an input row is done.  Completed rows behind a
+    parked row are held back, up to q_retry_reorder_buffer rows, to keep the output order.  The first
+    exception raised by a call cancels the calls that have not started and is re-raised.
+    """
+    max_in_flight = max(workers, 1) * 2
+    executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="api_worker")
+    try:
+        in_flight = {}  # future -> (index, path, prepared_row, attempt)
+        retry_queue = []  # heap of (due_time, index, path, prepared_row, attempt)
+        child_queue = deque()  # (index, path, prepared_row)
+        trees = {}  # index -> [calls pending, {path: (prepared_row, result, attempts)}]
+        completed = {}  # index -> [(prepared_row, result, attempts), ...] in depth first order
+        next_index = 0
+        rows = enumerate(prepared_rows)
+        rows_exhausted = False
+
+        def submit(index, path, prepared_row, attempt):
+            in_flight[executor.submit(call_api, prepared_row, attempt)] = (index, path, prepared_row, attempt)
+
+        while True:
+            now = time.monotonic()
+            # Children go first, then due retries, then new rows while the reorder buffer has room
+            while child_queue and len(in_flight) < max_in_flight:
+                submit(*child_queue.popleft(), 1)
+            while retry_queue and retry_queue[0][0] <= now and len(in_flight) < max_in_flight:
+                submit(*heapq.heappop(retry_queue)[1:])
+            while not rows_exhausted and len(in_flight) < max_in_flight \
+                    and len(completed) < q_retry_reorder_buffer:
+                try:
+                    index, prepared_row = next(rows)
+                except StopIteration:
+                    rows_exhausted = True
+                    break
+                trees[index] = [1, {}]
+                submit(index, (), prepared_row, 1)
+
+            while next_index in completed:
+                yield from completed.pop(next_index)
+                next_index += 1
+            if rows_exhausted and not in_flight and not retry_queue and not child_queue:
+                return
+
+            timeout = max(retry_queue[0][0] - now, 0.0) if retry_queue else None
+            if not in_flight:
+                time.sleep(timeout)
+                continue
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, path, prepared_row, attempt = in_flight.pop(future)
+                result, retry_delay, children = future.result()
+                if retry_delay is not None and attempt < max_attempts:
+                    heapq.heappush(retry_queue,
+                                   (time.monotonic() + retry_delay, index, path, prepared_row, attempt + 1))
+                    continue
+                tree = trees[index]
+                tree[1][path] = (prepared_row, result, attempt)
+                tree[0] += len(children or ()) - 1
+                for child_number, child_row in enumerate(children or (), 1):
+                    child_queue.append((index, path + (child_number,), child_row))
+                if tree[0] == 0:
+                    # Path tuples sort parents before their children
+                    completed[index] = [tree[1][key] for key in sorted(tree[1])]
+                    del trees[index]
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
 def execute_api_calls_into_execution_log(
     _db_path: Path,
     source_table: str = "qualys_attribute_payloads_transformed",
@@ -1143,16 +3499,50 @@ def execute_api_calls_into_execution_log(
     _q_api_fqdn: str = "",
     _q_api_endpoint: str = "",
     _q_api_function: str = "",
-    _dry_run: bool = False
+    _dry_run: bool = False,
+    _workers: int = 1,
+    _rate_limiter: Optional[QualysRateLimiter] = None,
+    _resume: bool = False,
+    _source_rows: Optional[List[tuple]] = None,
+    _database: Optional[QualysRunDatabase] = None
 ) -> None:
     """
     Creates or replaces a new SQLite table 'qualys_attribute_payloads_transformed_execution_log' and inserts
     all rows from qualys_attribute_payloads_transformed, leaving status and execution_log blank.
 
+    With _workers greater than 1 the API calls run concurrently in a thread pool.  Only the
+    ExecutionLogWriter thread writes to SQLite, and results are written in group/batch order regardless
+    of the order in which calls complete.  Throughput and latency percentiles are reported at the end of the stage.
+
+    A retryable failure (409, 429, 5xx or a request exception) does not block the stage: the batch is
+    parked in a deferred retry queue with exponential backoff and jitter, or the Retry-After wait,
+    and retried later while other batches keep flowing.  The attempts and final outcome of each
+    batch are recorded in the attempts and outcome columns.
+
+    A batch that fails without being retryable, e.g. a 200 whose responseCode is not SUCCESS because one
+    asset ID is unknown, is recorded as 'bisected' and split into two sub batches that are called in
+    turn, recursively, until the bad asset IDs are isolated as 'failed' rows of one asset.  Good assets
+    are still updated, at about 2 * log2(batch size) extra calls per bad asset ID.  Sub batches are
+    logged right after their parent with sub_batch and parent_sub_batch set.  Bisection stops, leaving
+    'failed' rows of several assets, once both halves of a batch fail with the same status and response
+    as the batch, an error not tied to asset IDs, or after q_bisect_max_calls sub batch calls of a batch.
+
+    The writer commits every q_log_commit_rows rows or q_log_commit_seconds seconds, so a run that dies
+    part way can be continued with _resume: the existing table is kept, rows that did not end
+    in success are removed, and only batches without a successful row are executed.  A bisected batch
+    counts as done once all of its sub batches are final.
+
+    The streaming pipeline passes its batches as _source_rows, tuples in the column order of
+    source_table, which is then not read.
+
+    At the end of the stage the assets of the successful batches are added to
+    qualys_attribute_payloads_applied, so the database can be the --baseline-db of the next run.
+
     Args:
         _db_path (Path): Path to the SQLite database file.
         source_table (str): Name of the source table (default: qualys_attribute_payloads_transformed).
         new_table_name (str): Name of the new table (default: qualys_attribute_payloads_transformed_execution_log).
+        _database (QualysRunDatabase): Run database shared by the stages of the run (optional).
 
     Raises:
         FileNotFoundError: If the database file does not exist.
@@ -1166,21 +3556,31 @@ def execute_api_calls_into_execution_log(
         :param _q_api_function:
         :param _q_api_endpoint:
         :param _dry_run:
+        :param _workers:
+        :param _rate_limiter:
+        :param _resume:
+        :param _source_rows:
+        :param _database:
 
     """
     _db_path = Path(_db_path)
-    if not _db_path.exists():
+    if _source_rows is None and not database_exists(_db_path, _database):
         raise FileNotFoundError(f"Database file not found: {_db_path}")
 
     try:
-        with (sqlite3.connect(_db_path) as conn):
-            conn.execute("PRAGMA foreign_keys=OFF")  # Disable foreign keys for performance
+        with connect_database(_db_path, _database) as conn:
             cursor = conn.cursor()
 
-            # Drop and create the new table
-            cursor.execute(f'DROP TABLE IF EXISTS {new_table_name}')
+            if _source_rows is None:
+                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (source_table,))
+                if not cursor.fetchone():
+                    raise WorkflowError(f"Table '{source_table}' does not exist in the database {_db_path}")
+
+            # Drop and create the new table, resume keeps it
+            if not _resume:
+                cursor.execute(f'DROP TABLE IF EXISTS {new_table_name}')
             cursor.execute(f"""
-                CREATE TABLE {new_table_name} (
+                CREATE TABLE IF NOT EXISTS {new_table_name} (
                     asset_ids TEXT,
                     payload TEXT,
                     payload_custom_attributes TEXT,
@@ -1188,77 +3588,260 @@ def execute_api_calls_into_execution_log(
                     group_number INTEGER,
                     batch_number INTEGER,
                     status TEXT,
-                    execution_log TEXT
+                    execution_log TEXT,
+                    attempts INTEGER,
+                    outcome TEXT,
+                    sub_batch TEXT,
+                    parent_sub_batch TEXT
                 )
             """)
 
-            # Select rows from source table and fetch all to avoid cursor conflict
-            cursor.execute(f"""
-                SELECT asset_ids, payload, payload_custom_attributes, count_asset_ids, group_number, batch_number
-                FROM {source_table}
-            """)
-            all_rows = cursor.fetchall()
-
-            print(f"Inserting rows from {source_table} into {new_table_name}...")
-            print(f"Payload function is {_q_api_function} for API {_q_api_fqdn}{_q_api_endpoint}. ...")
-            rows_inserted = 0
-            for row in all_rows:
-                rows_inserted += 1
+            if _resume:
+                # Tables from before the attempts and outcome columns count status 200 as success
+                cursor.execute(f"PRAGMA table_info({new_table_name})")
+                existing_columns = {column[1] for column in cursor.fetchall()}
+                for column, column_type in (('attempts', 'INTEGER'), ('outcome', 'TEXT'),
+                                            ('sub_batch', 'TEXT'), ('parent_sub_batch', 'TEXT')):
+                    if column not in existing_columns:
+                        cursor.execute(f"ALTER TABLE {new_table_name} ADD COLUMN {column} {column_type}")
+                # A batch is done when every row of it is final and each bisected row has both halves
+                cursor.execute(f"""
+                    DELETE FROM {new_table_name}
+                    WHERE (group_number, batch_number) NOT IN (
+                        SELECT group_number, batch_number
+                        FROM {new_table_name}
+                        GROUP BY group_number, batch_number
+                        HAVING SUM(COALESCE(sub_batch, '') = '') = 1
+                           AND SUM(NOT (outcome IN ('success', 'bisected', 'failed')
+                                        OR (outcome IS NULL AND CAST(status AS TEXT) = '200'))) = 0
+                           AND 2 * SUM(outcome = 'bisected') = COUNT(*) - 1
+                    )
+                """)
+                conn.commit()
+                # The done batches are keyed in a temp table, so skipping them is an index lookup
+                cursor.execute("DROP TABLE IF EXISTS temp.done_batches")
+                cursor.execute("""
+                    CREATE TEMP TABLE done_batches (
+                        group_number INTEGER,
+                        batch_number INTEGER,
+                        PRIMARY KEY (group_number, batch_number)
+                    ) WITHOUT ROWID
+                """)
+                cursor.execute("INSERT OR IGNORE INTO temp.done_batches "
+                               f"SELECT group_number, batch_number FROM {new_table_name}")
+                done_count = cursor.execute("SELECT COUNT(*) FROM temp.done_batches").fetchone()[0]
+
+            # Stream the source rows on a separate read cursor of the same connection, so memory stays
+            # flat however many batches there are; the log rows are written through cursor meanwhile
+            if _source_rows is None:
+                not_done = """
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM temp.done_batches AS d
+                        WHERE d.group_number = s.group_number AND d.batch_number = s.batch_number
+                    )""" if _resume else ""
+                rows_to_execute = cursor.execute(f"SELECT COUNT(*) FROM {source_table} AS s {not_done}").fetchone()[0]
+                # Fetched in chunks, so this thread seldom waits for a commit of the writer thread
+                read_cursor = conn.cursor()
+                read_cursor.arraysize = q_log_commit_rows
+                read_cursor.execute(f"""
+                    SELECT asset_ids, payload, payload_custom_attributes, count_asset_ids, group_number, batch_number
+                    FROM {source_table} AS s {not_done}
+                    ORDER BY group_number, batch_number
+                """)
+                all_rows = (row for rows in iter(read_cursor.fetchmany, []) for row in rows)
+            else:
+                all_rows = _source_rows
+                source_table = "the streaming pipeline"
+                if _resume:
+                    done_batches = set(cursor.execute("SELECT group_number, batch_number FROM temp.done_batches"))
+                    all_rows = [row for row in all_rows if (row[4], row[5]) not in done_batches]
+                rows_to_execute = len(all_rows)
+
+            if _resume:
+                print(f"Resuming {new_table_name}: {done_count} batches already done, "
+                      f"{rows_to_execute} batches to execute.")
+                q_run_summary['Resumed batches'] = f"{done_count} already done, {rows_to_execute} executed"
+
+            def prepare_row(row):
                 asset_ids, payload, payload_custom_attributes, count_asset_ids, group_number, batch_number = row
                 # Handle None values and clean BOM
                 asset_ids = asset_ids.replace('\ufeff', '') if asset_ids else ''
                 payload = payload if payload is not None else ''
                 payload_custom_attributes = payload_custom_attributes.replace('\ufeff', '') if payload_custom_attributes else ''
-                payload = update_custom_attribute_operation(_json_data_str=payload, operation=_q_api_function)
+                # Payloads built by the transform stage are rebuilt for the operation from cached fragments
+                ids = [asset_id.strip() for asset_id in asset_ids.split(',') if asset_id.strip()]
+                if payload == q_payload_builder.batch_body(ids, payload_custom_attributes, 'add'):
+                    payload = q_payload_builder.batch_body(ids, payload_custom_attributes, _q_api_function)
+                else:
+                    payload = update_custom_attribute_operation(_json_data_str=payload, operation=_q_api_function)
                 count_asset_ids = count_asset_ids if count_asset_ids is not None else 0
-
+                return asset_ids, payload, payload_custom_attributes, count_asset_ids, group_number, batch_number, \
+                    '', None
+
+            def bisect_row(prepared_row):
+                """Splits a failed batch into two halves, numbered below the sub_batch of the batch."""
+                asset_ids, payload, payload_custom_attributes, _, group_number, batch_number, sub_batch, _ = \
+                    prepared_row
+                ids = [asset_id for asset_id in asset_ids.split(',') if asset_id]
+                middle = len(ids) // 2
+                children = []
+                for child_number, child_ids in enumerate((ids[:middle], ids[middle:]), 1):
+                    child_sub_batch = f"{sub_batch}.{child_number}" if sub_batch else str(child_number)
+                    children.append((','.join(child_ids), replace_payload_asset_ids(payload, child_ids),
+                                     payload_custom_attributes, len(child_ids), group_number, batch_number,
+                                     child_sub_batch, sub_batch))
+                return children
+
+            # (group_number, batch_number) -> [sub batch calls, {sub_batch: failure}, failures not bisected]
+            bisect_state = {}
+            bisect_lock = threading.Lock()
+
+            def bisect_stop_reason(prepared_row, response):
+                """
+                Returns why a failed batch is not bisected, or None to bisect it.  When both halves of a batch
+                fail with the status and response of the batch, the error is not tied to asset IDs, and no
+                batch of the same batch_number is bisected again for that failure.  At most q_bisect_max_calls
+                sub batches are called per batch either way.
+                """
+                _, _, _, _, group_number, batch_number, sub_batch, parent_sub_batch = prepared_row
+                failure = (response.status_code, response.text)
+                with bisect_lock:
+                    state = bisect_state.setdefault((group_number, batch_number), [0, {}, set()])
+                    calls, failures, not_bisected = state
+                    failures[sub_batch] = failure
+                    if failure in not_bisected:
+                        return "a batch of the same batch number failed the same way in both halves"
+                    if sub_batch:
+                        sibling = (f"{parent_sub_batch}." if parent_sub_batch else "") + \
+                                  ('2' if sub_batch.rsplit('.', 1)[-1] == '1' else '1')
+                        if failures.get(parent_sub_batch) == failure and failures.get(sibling) == failure:
+                            not_bisected.add(failure)
+                            return "both halves failed like their parent, the error is not tied to asset IDs"
+                    if calls + 2 > q_bisect_max_calls:
+                        return f"the limit of {q_bisect_max_calls} sub batch calls per batch is reached"
+                    state[0] = calls + 2
+                return None
+
+            # One pooled keep-alive client for every call of this stage
+            client = None
+            if not _dry_run:
+                client = QualysApiClient(_q_api_fqdn, _q_username, _q_password,
+                                         pool_size=max(q_http_pool_size, _workers),
+                                         rate_limiter=_rate_limiter)
+
+            max_attempts = client.max_retries if client is not None else 1
+
+            def call_api(prepared_row, attempt):
+                """
+                Runs one attempt of an API call.  Returns ((response, latency, error, outcome), retry_delay,
+                children), where retry_delay is None once the attempt is final and children are the two
+                halves of a failed batch of more than one asset.
+                """
                 if _dry_run:
-                    print(f"Dry run flag is set to {_dry_run}.  Create databases, and do not run API calls")
-                    response = None
-                else:
-                    response = update_qualys_assets(
-                    _q_username=_q_username,
-                    _q_password=_q_password,
-                    _q_api_fqdn=_q_api_fqdn,
-                    _q_api_endpoint=_q_api_endpoint,
-                    _payload=payload,
-                    _group_number=group_number,
-                    _batch_number=batch_number,
-                    _q_api_function=_q_api_function)
-
-                # Insert row with blank status and execution_log
-                status = 'none'
-                execution_log = 'none'
-                if response:
-                    execution_log = response.text
-                    status = response.status_code
-                    execution_log_message = re.sub(r' +', ' ', re.sub(r'[\r\n]+', '', execution_log)).strip()
-                    print(f"{datetime.now():%Y-%m-%d %H:%M:%S} | "
-                          f"API Call Number: {rows_inserted:>10,}, "
-                          f"API Call Operation: {_q_api_function}, "
-                          f"API Status: {status}. "
-                          f"Execution log: {execution_log_message}")
-
-                cursor.execute(
-                    f"INSERT INTO {new_table_name} (asset_ids, payload, payload_custom_attributes, count_asset_ids, group_number, batch_number, status, execution_log) "
-                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                    (asset_ids, payload, payload_custom_attributes, count_asset_ids, group_number, batch_number, status, execution_log)
-                )
-
-                # Commit every 1000 rows
-                if rows_inserted % 1000 == 0:
-                    conn.commit()
-                    print(f"Inserted {rows_inserted} rows into {new_table_name}")
+                    return (None, 0.0, None, 'dry_run'), None, None
+                _, payload, _, count_asset_ids, group_number, batch_number, sub_batch, _ = prepared_row
+                batch_name = f"group {group_number} batch {batch_number}" + \
+                             (f" sub batch {sub_batch}" if sub_batch else "")
+                call_start = time.perf_counter()
+                try:
+                    response, retryable, response_message = attempt_qualys_update(
+                        _client=client,
+                        _q_api_endpoint=_q_api_endpoint,
+                        _payload=payload,
+                        _group_number=group_number,
+                        _batch_number=batch_number,
+                        _q_api_function=_q_api_function)
+                except requests.RequestException as e:
+                    response, retryable, response_message = None, True, f"Request failed with {e}"
+                latency = time.perf_counter() - call_start
+                if not retryable:
+                    if qualys_update_succeeded(response):
+                        return (response, latency, None, 'success'), None, None
+                    stop_reason = bisect_stop_reason(prepared_row, response) if count_asset_ids > 1 else None
+                    if count_asset_ids > 1 and stop_reason is None:
+                        print(f"Failed {batch_name} of {count_asset_ids} assets: {response_message}. "
+                              f"Bisecting into two sub batches.")
+                        return (response, latency, response_message, 'bisected'), None, bisect_row(prepared_row)
+                    print(f"Failed {batch_name}: {response_message}." +
+                          (f" Not bisected, {stop_reason}." if stop_reason else ""))
+                    return (response, latency, response_message, 'failed'), None, None
+                if attempt >= max_attempts:
+                    print(f"Attempt {attempt}/{max_attempts}: {response_message} for {batch_name}. "
+                          f"No more retries left.")
+                    return (response, latency, response_message, 'retries_exhausted'), None, None
+                retry_delay = get_retry_backoff_delay(attempt, response)
+                print(f"Attempt {attempt}/{max_attempts}: {response_message} for {batch_name}. "
+                      f"Deferred retry in {retry_delay:.1f} seconds.")
+                return (response, latency, response_message, 'retries_exhausted'), retry_delay, None
 
-            # Final commit
-            if rows_inserted % 1000 != 0:
-                conn.commit()
-                print(f"Final commit: Inserted {rows_inserted} rows into {new_table_name}")
+            print(f"Inserting rows from {source_table} into {new_table_name}...")
+            print(f"Payload function is {_q_api_function} for API {_q_api_fqdn}{_q_api_endpoint} "
+                  f"with {_workers} worker(s). ...")
+            if _dry_run:
+                print(f"Dry run flag is set to {_dry_run}.  Create databases, and do not run API calls")
+            latencies = []
+            stage_start = time.perf_counter()
+            rows_inserted = 0
+            outcomes = {}
+            # The writer thread inserts, commits and logs the results, this thread only dispatches API calls
+            writer = ExecutionLogWriter(conn, new_table_name, _q_api_function)
+            try:
+                for prepared_row, (response, latency, error, outcome), attempts in iterate_api_call_results(
+                        (prepare_row(row) for row in all_rows), call_api, _workers, max_attempts):
+                    rows_inserted += 1
+                    asset_ids, payload, payload_custom_attributes, count_asset_ids, group_number, batch_number, \
+                        sub_batch, parent_sub_batch = prepared_row
+                    if not _dry_run:
+                        latencies.append(latency)
+
+                    # Insert row with blank status and execution_log
+                    status = 'none'
+                    execution_log = 'none'
+                    if error is not None:
+                        execution_log = error
+                    outcomes[outcome] = outcomes.get(outcome, 0) + 1
+                    if response is not None:
+                        execution_log = response.text
+                        status = response.status_code
+
+                    writer.put((asset_ids, payload, payload_custom_attributes, count_asset_ids, group_number,
+                                batch_number, status, execution_log, attempts, outcome, sub_batch, parent_sub_batch),
+                               log_call=response is not None)
+            finally:
+                # The rows of a failed stage are committed too, so --resume skips their batches
+                writer.close()
+
+            if _resume:
+                cursor.execute("DROP TABLE temp.done_batches")
+            print(f"Final commit: Inserted {writer.rows_written} rows into {new_table_name} "
+                  f"in {writer.commits} commit(s)")
+
+            # The applied state makes this database the --baseline-db of the next run
+            applied_assets = update_applied_table(conn, new_table_name, _q_api_function)
+            conn.commit()
+            print(f"Added {applied_assets} successfully applied assets to qualys_attribute_payloads_applied")
 
             if rows_inserted == 0:
                 print(f"No rows found in {source_table}.")
             else:
                 print(f"Completed: Inserted {rows_inserted} rows from {source_table} into {new_table_name}.")
+                print(f"Outcomes: {', '.join(f'{outcome}={count}' for outcome, count in sorted(outcomes.items()))}")
+                q_run_summary['API call outcomes'] = ', '.join(f"{outcome}={count}"
+                                                               for outcome, count in sorted(outcomes.items()))
+
+            if latencies:
+                elapsed = time.perf_counter() - stage_start
+                throughput = len(latencies) / elapsed if elapsed > 0 else 0
+                p50, p90, p99 = (latency_percentile(latencies, pct) for pct in (50, 90, 99))
+                print(f"API calls: {len(latencies)} in {elapsed:.1f} seconds with {_workers} worker(s), "
+                      f"{throughput:.2f} calls/sec, latency p50={p50:.3f}s p90={p90:.3f}s p99={p99:.3f}s "
+                      f"max={max(latencies):.3f}s")
+                q_run_summary['API throughput'] = f"{len(latencies)} calls, {throughput:.2f} calls/sec, " \
+                                                  f"{_workers} worker(s)"
+                q_run_summary['API latency'] = f"p50={p50:.3f}s p90={p90:.3f}s p99={p99:.3f}s max={max(latencies):.3f}s"
+            if _rate_limiter is not None and not _dry_run:
+                print(f"Rate limiter: {_rate_limiter.summary()}")
+                q_run_summary['API rate limiter'] = _rate_limiter.summary()
 
     except sqlite3.Error as e:
         print(f"Database error: {e}")
@@ -1267,15 +3850,248 @@ def execute_api_calls_into_execution_log(
         print(f"Unexpected error: {e}")
         raise
     finally:
-        if 'conn' in locals():
-            conn.execute("PRAGMA foreign_keys=ON")  # Re-enable foreign keys
+        if 'client' in locals() and client is not None:
+            client.close()
+
+
+def run_streaming_pipeline(
+    _csv_data_file,
+    _db_path: Path,
+    max_asset_ids: int = 100,
+    max_body_bytes: Optional[int] = None,
+    key_only: bool = False,
+    audit_tables: bool = False,
+    _batch_size: int = None,
+    _parse_workers: int = 1,
+    _execute_kwargs: Optional[Dict[str, Any]] = None,
+    _database: Optional[QualysRunDatabase] = None
+) -> None:
+    """
+    Streaming pipeline (--pipeline streaming).  Fuses the ingest, payload, duplicates, clean, group, split
+    and transform stages into one pass over the CSV file with in-memory hash maps, and hands the batches
+    to execute_api_calls_into_execution_log.  Only the execution log table is written, plus, with
+    audit_tables, qualys_attribute_payloads_duplicates and qualys_attribute_payloads_transformed (which
+    --resume needs).  Batches, group and batch numbers are the same as in the materialized pipeline.
+
+    Args:
+        _csv_data_file: Path to the input CSV file.
+        _db_path (Path): Path to the SQLite database file.
+        max_asset_ids (int): Maximum number of asset_ids per API call (default: 100).
+        max_body_bytes (int): Maximum request body size in bytes, None to split by max_asset_ids only.
+        key_only (bool): Group by custom attribute keys only, for the remove function.
+        audit_tables (bool): Also write the duplicates and transformed tables.
+        _batch_size (int): Rows per parsed CSV batch (default: q_insert_batch_size).
+        _parse_workers (int): Number of processes used to parse the CSV file.
+        _execute_kwargs (Dict[str, Any]): Arguments for execute_api_calls_into_execution_log.
+        _database (QualysRunDatabase): Run database shared by the stages of the run (optional).
+
+    Raises:
+        WorkflowError: If the CSV file can not be read or a database error occurs.
+    """
+    if _batch_size is None:
+        _batch_size = q_insert_batch_size
+    _db_path = Path(_db_path)
+    start_time = time.perf_counter()
+    attribute_keys = [mapped_key for mapped_key in csv_data_contract.values() if mapped_key != 'AssetID']
+
+    # One pass over the CSV: each asset row's ID and cached attribute JSON, and the rows per asset ID
+    print(f"Streaming pipeline reading {_csv_data_file}...")
+    assets = []
+    id_counts = {}
+    try:
+        for rows in iterate_over_csv_row_batches(_csv_data_file, _batch_size, _parse_workers):
+            for row in rows:
+                asset_id = row[0]
+                payload_custom_attributes = q_payload_builder.custom_attribute_pairs(zip(attribute_keys, row[1:]))
+                asset_key = get_asset_key(asset_id)
+                id_counts[asset_key] = id_counts.get(asset_key, 0) + 1
+                assets.append((asset_id, payload_custom_attributes, asset_key))
+    except (FileNotFoundError, ValueError, csv.Error) as e:
+        print(f"Error: {e}")
+        raise WorkflowError(f"Error: {e}") from e
+    rows_read = len(assets)
+
+    # Every row of an asset_key seen more than once is dropped, as create_deduplicated_payload_tables does
+    duplicate_ids = {asset_key: count for asset_key, count in id_counts.items() if count > 1}
+    del id_counts
+    duplicates = [asset for asset in assets if asset[2] in duplicate_ids]
+    if duplicates:
+        assets = [asset for asset in assets if asset[2] not in duplicate_ids]
+    print(f"Read {rows_read} asset rows, dropped {rows_read - len(assets)} rows of {len(duplicate_ids)} "
+          f"duplicate asset IDs.")
+
+    # Group by attribute set, or key set for remove, numbered in the order of the grouping stage
+    groups = {}
+    group_keys = {}
+    for asset_id, payload_custom_attributes, _ in assets:
+        group_key = payload_custom_attributes
+        if key_only:
+            group_key = group_keys.get(payload_custom_attributes)
+            if group_key is None:
+                group_key = group_keys[payload_custom_attributes] = get_custom_attribute_keys(payload_custom_attributes)
+        groups.setdefault(group_key, []).append(asset_id.replace('\ufeff', ''))
+    del assets, group_keys
+
+    # Split and transform
+    batches = []
+    group_count = len(groups)
+    for group_number, group_key in enumerate(sorted(groups), 1):
+        ids_list = [asset_id.strip() for asset_id in groups.pop(group_key) if asset_id.strip()]
+        base_bytes = 0
+        if max_body_bytes is not None:
+            base_bytes = get_payload_body_base_bytes(group_key)
+            if base_bytes >= max_body_bytes:
+                print(f"  Request body without asset IDs is {base_bytes} bytes, over the "
+                      f"{max_body_bytes} bytes limit. Sending one asset ID per call.")
+        chunks = pack_asset_ids(ids_list, max_asset_ids, max_body_bytes, base_bytes) if ids_list else ['']
+        for batch_number, chunk in enumerate(chunks, 1):
+            chunk_ids = chunk.split(',') if chunk else []
+            batches.append((chunk, q_payload_builder.batch_body(chunk_ids, group_key, 'add'), group_key,
+                            len(chunk_ids), group_number, batch_number))
+    elapsed = time.perf_counter() - start_time
+    print(f"Streaming pipeline built {len(batches)} batches from {group_count} groups in {elapsed:.2f} seconds.")
+    q_run_summary['Streaming pipeline'] = (f"{rows_read} asset rows, {len(duplicates)} duplicate rows dropped, "
+                                           f"{group_count} groups, {len(batches)} batches in {elapsed:.2f} seconds")
+
+    if audit_tables:
+        try:
+            with connect_database(_db_path, _database) as conn:
+                cursor = conn.cursor()
+                cursor.execute("DROP TABLE IF EXISTS qualys_attribute_payloads_duplicates")
+                cursor.execute("CREATE TABLE qualys_attribute_payloads_duplicates (asset_id TEXT, "
+                               "payload_custom_attributes TEXT, asset_key TEXT, attr_hash TEXT, "
+                               "duplicate_count INTEGER)")
+                cursor.executemany("INSERT INTO qualys_attribute_payloads_duplicates (asset_id, "
+                                   "payload_custom_attributes, asset_key, attr_hash, duplicate_count) "
+                                   "VALUES (?, ?, ?, ?, ?)",
+                                   ((asset_id, payload_custom_attributes, asset_key,
+                                     q_payload_builder.attributes_hash(payload_custom_attributes),
+                                     duplicate_ids[asset_key])
+                                    for asset_id, payload_custom_attributes, asset_key in duplicates))
+                cursor.execute("DROP TABLE IF EXISTS qualys_attribute_payloads_transformed")
+                cursor.execute("""
+                    CREATE TABLE qualys_attribute_payloads_transformed (
+                        asset_ids TEXT,
+                        payload TEXT,
+                        payload_custom_attributes TEXT,
+                        count_asset_ids INTEGER,
+                        group_number INTEGER,
+                        batch_number INTEGER
+                    )
+                """)
+                cursor.executemany("INSERT INTO qualys_attribute_payloads_transformed (asset_ids, payload, "
+                                   "payload_custom_attributes, count_asset_ids, group_number, batch_number) "
+                                   "VALUES (?, ?, ?, ?, ?, ?)", batches)
+                conn.commit()
+                print(f"Wrote audit tables qualys_attribute_payloads_duplicates ({len(duplicates)} rows) and "
+                      f"qualys_attribute_payloads_transformed ({len(batches)} rows).")
+        except sqlite3.Error as e:
+            raise WorkflowError(f"SQLite error writing audit tables: {e}") from e
+    del duplicates
+
+    execute_api_calls_into_execution_log(_db_path=_db_path, _source_rows=batches, _database=_database,
+                                         **(_execute_kwargs or {}))
+
+
+def format_response_message(text: Optional[str]) -> str:
+    """
+    Joins a response body into one log line: removes line breaks, collapses runs of spaces and strips it.
+    Equivalent to re.sub(r' +', ' ', re.sub(r'[\r\n]+', '', text)).strip() without the regex engine.
+    """
+    if not text:
+        return ''
+    text = text.replace('\r', '').replace('\n', '')
+    if '  ' in text:
+        text = ' '.join(part for part in text.split(' ') if part)
+    return text.strip()
+
+
+def attempt_qualys_update(
+        _client: QualysApiClient, _q_api_endpoint: str, _payload: str, _q_api_function: str,
+        _group_number: int, _batch_number: int) -> Tuple[Response, bool, str]:
+    """
+    Sends one POST request to the Qualys API to update asset custom attributes, without retrying.
+
+    Args:
+        _client (QualysApiClient): Shared client with a pooled session.
+        _q_api_endpoint (str):  API endpoint
+        _payload (str): JSON ServiceRequest payload.
+        _q_api_function (str): Function add, update, remove
+        _group_number (int): group number for key/data pairs
+        _batch_number (int): batch number for key/data pairs
+
+    Returns:
+        Tuple[Response, bool, str]: The response, whether its status code is retryable (409, 429, 5xx),
+                                    and a one line response message for the log.  Check a response
+                                    that is not retryable with qualys_update_succeeded.
+
+    Raises:
+        requests.RequestException: If the request fails before a response is received.
+        WorkflowError: If the response is an authentication error (401, 403).
+    """
+    url = _client.url(_q_api_endpoint)
+    user_agent_message = f"{x_requested_with} user={_client.q_username} function={_q_api_function} group={_group_number} batch={_batch_number}"
+
+    response = _client.post(_q_api_endpoint, _payload, user_agent_message)
+    if response:
+        response_message = format_response_message(response.text)
+    else:
+        if response.status_code == 401:
+            response_message = f"Authentication Error status code: {response.status_code} - requests.post({url}, headers=headers, data=_payload)"
+        else:
+            response_message = f"Failure request status code: {response.status_code} - requests.post({url}, headers=headers, data={_payload})"
+
+    if response.status_code in _client.retryable_status_codes:
+        return response, True, f"Received HTTP {response.status_code} for URL {url}. Response: {response_message}"
+    if response.status_code in (401, 403):
+        # Credentials are wrong for every batch, no point in going on
+        raise WorkflowError(response_message)
+    return response, False, response_message
+
+
+def get_qualys_response_code(response: Response) -> Optional[str]:
+    """
+    Returns the ServiceResponse responseCode of a Qualys API response, from JSON or XML, or None when
+    the body carries none.
+    """
+    try:
+        return str(response.json()['ServiceResponse']['responseCode'])
+    except (ValueError, KeyError, TypeError):
+        pass
+    # The first <responseCode> element holding one token, as the XML is read on the API worker thread
+    # without the regex engine
+    text = response.text or ''
+    start = text.find('<responseCode>')
+    while start >= 0:
+        end = text.find('</responseCode>', start)
+        if end < 0:
+            return None
+        value = text[start + len('<responseCode>'):end]
+        if '<' not in value and len(value.split()) == 1:
+            return value.strip()
+        start = text.find('<responseCode>', start + 1)
+    return None
+
+
+def qualys_update_succeeded(response: Optional[Response]) -> bool:
+    """
+    A Qualys update succeeded when the status is 200 and the responseCode, if any, is SUCCESS.  Qualys
+    reports a batch it rejects, e.g. for an unknown asset ID, as 200 with another responseCode.
+    """
+    if response is None or response.status_code != 200:
+        return False
+    response_code = get_qualys_response_code(response)
+    return response_code is None or response_code == 'SUCCESS'
 
 
 def update_qualys_assets(
         _q_api_fqdn: str, _q_api_endpoint: str, _q_username: str, _q_password: str,
-        _payload: Dict[str, Any], _q_api_function: str, _group_number: int, _batch_number: int) -> Union[Response, None]:
+        _payload: Dict[str, Any], _q_api_function: str, _group_number: int, _batch_number: int,
+        _client: Optional[QualysApiClient] = None) -> Union[Response, None]:
     """
     Sends a POST request to the Qualys API to update asset custom attributes using Basic authentication.
+    Retries inline, sleeping the client's linear retry schedule between attempts.  The execute stage
+    uses attempt_qualys_update with a deferred retry queue instead.
 
     Args:
         _q_api_fqdn (str): Fully qualified domain name of the Qualys API (e.g., qualysapi.qg3.apps.qualys.com).
@@ -1286,6 +4102,8 @@ def update_qualys_assets(
         _q_api_function (str): Function add, update, remove
         _group_number (int): group number for key/data pairs
         _batch_number (int): batch number for key/data pairs
+        _client (QualysApiClient): Shared client with a pooled session.  When omitted a client is
+                                   created for this call only.
 
 
     Returns:
@@ -1296,77 +4114,40 @@ def update_qualys_assets(
     Raises:
         ValueError: If _q_api_fqdn, _q_username, or _q_password is empty.
     """
-    # Validate inputs
-    if not _q_api_fqdn:
-        raise ValueError("Qualys API FQDN must be provided")
-    if not _q_username:
-        raise ValueError("Qualys API username must be provided")
-    if not _q_password:
-        raise ValueError("Qualys API password must be provided")
-
-    # Construct URL using _q_api_fqdn
-    url = f"https://{_q_api_fqdn}{_q_api_endpoint}"
-
-    # Create Basic authentication header
-    auth_header = get_basic_auth(_q_username, _q_password)
+    if _client is None:
+        with QualysApiClient(_q_api_fqdn, _q_username, _q_password, pool_size=1) as client:
+            return update_qualys_assets(_q_api_fqdn, _q_api_endpoint, _q_username, _q_password, _payload,
+                                        _q_api_function, _group_number, _batch_number, _client=client)
 
-    user_agent_message = f"{x_requested_with} user={_q_username} function={_q_api_function} group={_group_number} batch={_batch_number}"
-
-    # Set headers
-    headers = {
-        'User-Agent': user_agent_message,
-        'X-Requested-With': x_requested_with,
-        'Content-Type': 'application/json',
-        'Authorization': auth_header
-    }
-
-    # Set Retries for API Call.
-    max_retries = 10
-    max_delay = 300  # Maximum delay in seconds
-    min_delay = 30  # Minimum delay in seconds
-
-    # Calculate retry delays dynamically
-    retry_delays = []
-    if max_retries <= 1:
-        retry_delays.append(min_delay)  # Single retry uses min_delay
-    else:
-        step = (max_delay - min_delay) / (max_retries - 1)  # Linear step size
-        for i in range(max_retries):
-            delay = min_delay + (step * i)  # Calculate delay for this attempt
-            delay = min(int(delay), max_delay)  # Cap at max_delay and convert to integer
-            retry_delays.append(delay)
+    # Construct URL using the client's _q_api_fqdn
+    url = _client.url(_q_api_endpoint)
 
-    retryable_status_codes = {409, 429} | set(range(500, 600))  # HTTP status codes to retry
+    # Retry policy is precomputed by the client
+    max_retries = _client.max_retries
+    retry_delays = _client.retry_delays
 
     for attempt in range(max_retries):
         try:
-            # Send POST request
-            response = requests.post(url, headers=headers, data=_payload)
-            if response:
-                response_message = response.text
-                response_message = re.sub(r' +', ' ', re.sub(r'[\r\n]+', '', response_message).strip())
-            else:
-                if response.status_code == 401:
-                    response_message = f"Authentication Error status code: {response.status_code} - requests.post({url}, headers=headers, data=_payload)"
-                else:
-                    response_message = f"Failure request status code: {response.status_code} - requests.post({url}, headers=headers, data={_payload})"
-
-            # Check if response status code requires a retry
-            if response.status_code in retryable_status_codes:
-                if attempt < max_retries - 1:  # If not the last attempt, retry
-                    sleep_time = retry_delays[attempt]
-                    print(f"Attempt {attempt + 1}/{max_retries}: Received HTTP {response.status_code} "
-                          f"for URL {url}. Retrying after {sleep_time} seconds... Response: {response_message}")
-                    time.sleep(sleep_time)
-                    continue
-                else:
-                    print(f"Attempt {attempt + 1}/{max_retries}: Received HTTP {response.status_code} "
-                          f"for URL {url}. No more retries left. Response: {response_message}")
-                    return response  # Return the response even if it's an error
-            if response.status_code == 200:
+            response, retryable, response_message = attempt_qualys_update(
+                _client, _q_api_endpoint, _payload, _q_api_function, _group_number, _batch_number)
+            if not retryable:
+                if response.status_code != 200:
+                    raise WorkflowError(response_message)
                 return response
+
+            # Response status code requires a retry
+            if attempt < max_retries - 1:  # If not the last attempt, retry
+                sleep_time = retry_delays[attempt]
+                if _client.rate_limiter is not None and 'X-RateLimit-ToWait-Sec' in response.headers:
+                    # The rate limiter already holds every call until the reported wait is over
+                    sleep_time = 0
+                print(f"Attempt {attempt + 1}/{max_retries}: {response_message}. "
+                      f"Retrying after {sleep_time} seconds...")
+                time.sleep(sleep_time)
+                continue
             else:
-                raise WorkflowError(response_message)
+                print(f"Attempt {attempt + 1}/{max_retries}: {response_message}. No more retries left.")
+                return response  # Return the response even if it's an error
 
         except requests.RequestException as e:
             if attempt < max_retries - 1:  # If not the last attempt, retry
@@ -1386,6 +4167,117 @@ def update_qualys_assets(
     return None
 
 
+def get_api_url(_q_api_fqdn: str, _q_api_endpoint: str) -> str:
+    """
+    Builds the API URL for an endpoint.  A plain FQDN is called over https, an FQDN that already
+    carries a scheme (e.g. http://127.0.0.1:8080 for a local stub server) is used as given.
+    """
+    if _q_api_fqdn.startswith(('http://', 'https://')):
+        return f"{_q_api_fqdn.rstrip('/')}{_q_api_endpoint}"
+    return f"https://{_q_api_fqdn}{_q_api_endpoint}"
+
+
+def parse_qualys_asset_custom_attributes(_asset: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Extracts the custom attributes of one Asset from a search/am/asset JSON response as a key to
+    value dictionary.  Accepts both the QPS list form {"list": [{"CustomAttribute": {...}}]} and the
+    plain form {"CustomAttribute": [...]}.
+    """
+    custom_attributes = _asset.get('customAttributes') or {}
+    items = custom_attributes.get('list')
+    if items is None:
+        items = custom_attributes.get('CustomAttribute') or []
+        if isinstance(items, dict):
+            items = [items]
+    current = {}
+    for item in items:
+        attribute = item.get('CustomAttribute', item) if isinstance(item, dict) else {}
+        if 'key' in attribute:
+            current[str(attribute['key'])] = '' if attribute.get('value') is None else str(attribute['value'])
+    return current
+
+
+def search_qualys_assets(
+        _q_api_fqdn: str, _q_api_endpoint: str, _q_username: str, _q_password: str,
+        _asset_ids: List[str], _client: Optional[QualysApiClient] = None) -> Dict[str, Dict[str, str]]:
+    """
+    Reads the current custom attributes of a list of assets from the Qualys asset search API, following
+    hasMoreRecords until every page has been read.  A page that fails with a retryable status (409, 429,
+    5xx) or a request exception is retried up to max_retries attempts of the client, waiting
+    get_retry_backoff_delay between attempts.
+
+    Args:
+        _q_api_fqdn (str): Fully qualified domain name of the Qualys API.
+        _q_api_endpoint (str): Search API endpoint (q_api_search_endpoint).
+        _q_username (str): Qualys API username.
+        _q_password (str): Qualys API password.
+        _asset_ids (List[str]): Asset IDs to look up.
+        _client (QualysApiClient): Shared client with a pooled session.  When omitted a client is
+                                   created for this call only.
+
+    Returns:
+        Dict[str, Dict[str, str]]: Asset ID to its current custom attributes.  Assets unknown to Qualys
+                                   are not included.
+
+    Raises:
+        WorkflowError: If the API call fails without a retryable status, runs out of attempts or does not
+                       return SUCCESS.
+    """
+    if _client is None:
+        with QualysApiClient(_q_api_fqdn, _q_username, _q_password, pool_size=1) as client:
+            return search_qualys_assets(_q_api_fqdn, _q_api_endpoint, _q_username, _q_password, _asset_ids,
+                                        _client=client)
+
+    url = _client.url(_q_api_endpoint)
+    user_agent_message = f"{x_requested_with} user={_client.q_username} function=prefetch"
+
+    current_attributes = {}
+    offset = 1
+    while True:
+        payload = json.dumps({
+            "ServiceRequest": {
+                "filters": {"Criteria": [{"field": "id", "operator": "IN", "value": ','.join(_asset_ids)}]},
+                "preferences": {"limitResults": len(_asset_ids), "startFromOffset": offset}
+            }
+        })
+        # Retryable statuses and request exceptions are retried with the backoff of the execute stage
+        for attempt in range(1, _client.max_retries + 1):
+            try:
+                response = _client.post(_q_api_endpoint, payload, user_agent_message, {'Accept': 'application/json'})
+            except requests.RequestException as e:
+                if attempt >= _client.max_retries:
+                    raise WorkflowError(f"Asset search request failed for URL {url}: {e}") from e
+                response, response_message = None, f"Request failed with {e}"
+            else:
+                if response.status_code not in _client.retryable_status_codes or attempt >= _client.max_retries:
+                    break
+                response_message = f"Received HTTP {response.status_code}"
+            retry_delay = get_retry_backoff_delay(attempt, response)
+            print(f"Attempt {attempt}/{_client.max_retries}: {response_message} for asset search {url}. "
+                  f"Retry in {retry_delay:.1f} seconds.")
+            time.sleep(retry_delay)
+        if response.status_code != 200:
+            response_message = format_response_message(response.text)
+            raise WorkflowError(f"Asset search failed with HTTP {response.status_code} for URL {url}: {response_message}")
+        try:
+            service_response = response.json()['ServiceResponse']
+        except (ValueError, KeyError) as e:
+            raise WorkflowError(f"Asset search returned an unexpected response for URL {url}: {e}") from e
+        if service_response.get('responseCode') != 'SUCCESS':
+            raise WorkflowError(f"Asset search returned responseCode {service_response.get('responseCode')} "
+                                f"for URL {url}: {service_response.get('responseErrorDetails')}")
+
+        records = service_response.get('data') or []
+        for record in records:
+            _asset = record.get('Asset', record)
+            if 'id' in _asset:
+                current_attributes[str(_asset['id'])] = parse_qualys_asset_custom_attributes(_asset)
+
+        if str(service_response.get('hasMoreRecords', 'false')).lower() != 'true' or not records:
+            return current_attributes
+        offset += len(records)
+
+
 def get_basic_auth(_q_username, _q_password) -> str:
     authorization = 'Basic ' + \
                     base64.b64encode(f"{_q_username}:{_q_password}".encode('utf-8')).decode('utf-8')
@@ -1397,10 +4289,13 @@ def get_basic_auth(_q_username, _q_password) -> str:
 
 def configuration():
     global q_csv_file, q_database_file, q_api_fqdn, q_username, q_password, q_api_function, q_max_asset_ids, dry_run_flag
+    global q_run_options
 
     try:
         # Get configuration
-        q_csv_file, q_database_file, q_api_fqdn, q_username, q_password, q_api_function, dry_run_flag = get_config()
+        q_csv_file, q_database_file, q_api_fqdn, q_username, q_password, q_api_function, dry_run_flag, \
+            q_run_options = get_config()
+        q_max_asset_ids = q_run_options['max_asset_ids']
     except ValueError as e:
         # Errors are already printed by get_config with usage, so just exit
         sys.exit(1)
@@ -1411,39 +4306,145 @@ def process_workflow():
     with q_log_file.open('a', encoding='utf-8') as f:
         with redirect_stdout(f), redirect_stderr(f):
             print(f"\n=== Run started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===")
+            # One rate limiter paces every API call of the run
+            rate_limiter = QualysRateLimiter(calls_per_window=q_run_options['rate_limit'],
+                                             concurrency_limit=q_run_options['concurrency_limit'])
+
+            execute_kwargs = {"_db_path": q_database_file,
+                              "_q_api_function": q_api_function,
+                              "_q_username": q_username,
+                              "_q_password": q_password,
+                              "_q_api_fqdn": q_api_fqdn,
+                              "_q_api_endpoint": q_api_endpoint,
+                              "_dry_run": dry_run_flag,
+                              "_workers": q_run_options['workers'],
+                              "_rate_limiter": rate_limiter,
+                              }
+
             # Workflow with configured paths and API settings
             workflow = [
-                (create_axonius_table, {"_csv_data_file": q_csv_file}),
-                (create_payloads_table, {"_db_path": q_database_file}),
+                (create_axonius_table, {"_csv_data_file": q_csv_file,
+                                        "_batch_size": q_insert_batch_size,
+                                        "_parse_workers": q_run_options['parse_workers']}),
+                (create_payloads_table, {"_db_path": q_database_file,
+                                         "asset_id_type": q_run_options['asset_id_type']}),
                 (populate_payloads_table, {"_db_path": q_database_file}),
-                (create_payloads_duplicates_table, {"_db_path": q_database_file}),
-                (create_non_duplicate_payload_table, {"_db_path": q_database_file,
-                                                      "main_table": "qualys_attribute_payloads",
-                                                      "dup_table": "qualys_attribute_payloads_duplicates",
+                (create_deduplicated_payload_tables, {"_db_path": q_database_file,
+                                                      "source_table": "qualys_attribute_payloads",
                                                       "new_table": "qualys_attribute_payloads_clean",
-                                                      "case_insensitive": True}),
-                (create_group_payloads_by_asset_table, {"_db_path": q_database_file}),
-                (create_split_payloads_table, {"_db_path": q_database_file, "max_asset_ids": q_max_asset_ids}),
-                (create_transform_payloads_table, {"_db_path": q_database_file}),
-                (execute_api_calls_into_execution_log,
-                 {"_db_path": q_database_file,
-                  "_q_api_function": q_api_function,
-                  "_q_username": q_username,
-                  "_q_password": q_password,
-                  "_q_api_fqdn": q_api_fqdn,
-                  "_q_api_endpoint": q_api_endpoint,
-                  "_dry_run": dry_run_flag,
-                  }
-                 ),
+                                                      "dup_table": "qualys_attribute_payloads_duplicates",
+                                                      "asset_id_type": q_run_options['asset_id_type']}),
+            ]
+
+            # Delta mode groups only new or changed assets
+            grouping_source_table = "qualys_attribute_payloads_clean"
+            if q_run_options['baseline_db'] is not None:
+                workflow.append((create_delta_payload_table, {"_db_path": q_database_file,
+                                                              "_baseline_db_path": q_run_options['baseline_db'],
+                                                              "max_asset_ids": q_max_asset_ids,
+                                                              "key_only": q_api_function == 'remove',
+                                                              "api_function": q_api_function}))
+                grouping_source_table = "qualys_attribute_payloads_delta"
+
+            # Prefetch drops assets whose custom attributes already match in Qualys
+            if q_run_options['prefetch'] and dry_run_flag:
+                print("Dry run flag is set, skipping prefetch of current custom attributes.")
+            elif q_run_options['prefetch']:
+                workflow.append((prefetch_qualys_custom_attributes, {"_db_path": q_database_file,
+                                                                     "_q_username": q_username,
+                                                                     "_q_password": q_password,
+                                                                     "_q_api_fqdn": q_api_fqdn,
+                                                                     "_q_api_function": q_api_function,
+                                                                     "source_table": grouping_source_table,
+                                                                     "page_size": q_max_asset_ids,
+                                                                     "_rate_limiter": rate_limiter}))
+                grouping_source_table = "qualys_attribute_payloads_pending"
+
+            # The optimizer regroups the keys of each asset into the plan with the fewest API calls
+            if q_run_options['optimize_grouping']:
+                workflow.append((create_optimized_grouping_table, {"_db_path": q_database_file,
+                                                                   "max_asset_ids": q_max_asset_ids,
+                                                                   "source_table": grouping_source_table,
+                                                                   "key_only": q_api_function == 'remove'}))
+                grouping_source_table = "qualys_attribute_payloads_optimized"
+
+            workflow += [
+                (create_group_payloads_by_asset_table, {"_db_path": q_database_file,
+                                                        "source_table": grouping_source_table,
+                                                        "key_only": q_api_function == 'remove',
+                                                        "asset_id_type": q_run_options['asset_id_type']}),
+                (create_split_payloads_table, {"_db_path": q_database_file,
+                                               "max_asset_ids": q_max_asset_ids,
+                                               "max_body_bytes": q_run_options['max_body_bytes'],
+                                               "asset_id_type": q_run_options['asset_id_type']}),
+                (create_transform_payloads_table, {"_db_path": q_database_file,
+                                                   "asset_id_type": q_run_options['asset_id_type']}),
+                (execute_api_calls_into_execution_log, execute_kwargs),
             ]
 
+            # Streaming fuses every stage up to transform into one pass over the CSV in memory
+            if q_run_options['pipeline'] == 'streaming':
+                workflow = [(run_streaming_pipeline, {"_csv_data_file": q_csv_file,
+                                                      "_db_path": q_database_file,
+                                                      "max_asset_ids": q_max_asset_ids,
+                                                      "max_body_bytes": q_run_options['max_body_bytes'],
+                                                      "key_only": q_api_function == 'remove',
+                                                      "audit_tables": q_run_options['audit_tables'],
+                                                      "_batch_size": q_insert_batch_size,
+                                                      "_parse_workers": q_run_options['parse_workers'],
+                                                      "_execute_kwargs": {key: value for key, value in
+                                                                          execute_kwargs.items()
+                                                                          if key != "_db_path"}})]
+
+            # Resume runs only the execute stage against the existing database
+            if q_run_options['resume_db'] is not None:
+                workflow = [(execute_api_calls_into_execution_log, dict(execute_kwargs, _resume=True))]
+
+            # Every run applies and records its storage profile before the first stage
+            workflow.insert(0, (record_storage_profile, {"_db_path": q_database_file}))
+
+            # One run database connection is shared by every stage.  Memory mode runs the stages against an
+            # in-memory database, saved to the file when it is closed at the end or on failure
+            try:
+                run_database = QualysRunDatabase(q_database_file, q_run_options['storage_profile'],
+                                                 q_run_options['db_mode'],
+                                                 auto_vacuum='INCREMENTAL' if q_run_options['persistent_db']
+                                                 else None)
+            except sqlite3.Error as e:
+                print(f"Database error opening {q_database_file}: {e}")
+                raise WorkflowError(f"Error opening {q_database_file}: {e}") from e
+
+            # A persistent database records the run in its history, a resume continues the latest run
+            run_id = None
+            if q_run_options['persistent_db'] is not None or \
+                    (q_run_options['resume_db'] is not None and has_run_history(run_database)):
+                try:
+                    run_id = begin_history_run(run_database, q_csv_file, q_api_function, dry_run_flag)
+                except sqlite3.Error as e:
+                    run_database.close()
+                    print(f"Database error starting the run history in {q_database_file}: {e}")
+                    raise WorkflowError(f"Error starting the run history in {q_database_file}: {e}") from e
+
             # Execute workflow
-            for func, kwargs in workflow:
+            run_status, run_start, stage_seconds = 'failed', time.perf_counter(), {}
+            try:
+                for func, kwargs in workflow:
+                    stage_start = time.perf_counter()
+                    try:
+                        func(**kwargs, _database=run_database)
+                    except Exception as e:
+                        print(f"Error in {func.__name__}: {e}")
+                        raise WorkflowError(f"Failed in {func.__name__}: {e}") from e
+                    finally:
+                        stage_seconds[func.__name__] = time.perf_counter() - stage_start
+                run_status = 'success'
+            finally:
                 try:
-                    func(**kwargs)
-                except Exception as e:
-                    print(f"Error in {func.__name__}: {e}")
-                    raise WorkflowError(f"Failed in {func.__name__}: {e}") from e
+                    if run_id is not None:
+                        finish_history_run(run_database, run_id, run_status, time.perf_counter() - run_start,
+                                           stage_seconds)
+                finally:
+                    run_database.close()
 
 
 def main():
@@ -1482,5 +4483,7 @@ if __name__ == "__main__":
     print(f"    Input CSV File:       {q_csv_file}")
     print(f"    Output Database file: {q_database_file}")
     print(f"    Log file:             {q_log_file}")
+    for label, value in q_run_summary.items():
+        print(f"    {label + ':':<22}{value}")
 
 